@@ -4,9 +4,17 @@ import pygame
 
 from scripts.utils import load_images
 from scripts.tilemap import Tilemap
+from scripts.present import Presenter
 
 RENDER_SCALE = 2.0
 
+# Only redraw and update the parts of the screen that changed, and nothing at all while idle
+DIRTY_RECTS = True
+# Past this many changed areas in a frame it's cheaper to redraw everything
+MAX_DIRTY_RECTS = 32
+# Or once the changed areas together span this much of the display
+FULL_REDRAW_AREA = 0.75
+
 
 class Editor:
     def __init__(self):
@@ -16,7 +24,8 @@ class Editor:
         pygame.display.set_caption('Terrain Editor')
 
         # Change window resolution
-        self.screen = pygame.display.set_mode((640, 480))
+        self.presenter = Presenter((320, 240), 'stretch', flags=0, window_size=(640, 480))
+        self.screen = self.presenter.screen
 
         # Initialize second surface for rendering (used for asset scaling)
         self.display = pygame.Surface((320, 240))
@@ -63,19 +72,60 @@ class Editor:
         # Instantiate on grid tiles
         self.ongrid = True
 
+        # Autotile the painted tile and its neighbours while painting
+        self.autotile_paint = False
+
+        # Biggest tile image, the area a tile can cover from the top left of its cell
+        images = [img for imgs in self.assets.values() for img in imgs]
+        self.max_tile_size = (max(img.get_width() for img in images), max(img.get_height() for img in images))
+        # See-through versions of the tiles for the placement preview, made once per tile
+        self.previews = {}
+
+        # Areas of the display that changed since the last frame, None when everything has to be redrawn
+        self.dirty = None
+        self.last_scroll = None
+        # Preview images drawn last frame as (image, position) and the areas they covered
+        self.last_overlays = []
+        self.last_overlay_rects = []
+
+    # Translucent image of the selected tile
+    def preview(self):
+        key = (self.tile_group, self.tile_variant)
+        img = self.previews.get(key)
+        if img is None:
+            img = self.assets[self.tile_list[key[0]]][key[1]].copy()
+            img.set_alpha(100)
+            self.previews[key] = img
+        return img
+
+    # Mark an area of the display to be redrawn
+    def mark(self, rect):
+        if self.dirty is not None:
+            self.dirty.append(pygame.Rect(rect))
+
+    # Mark everything a change to a grid tile can touch (and its neighbours if they get autotiled)
+    def mark_tile(self, tile_pos, render_scroll):
+        margin = self.tilemap.tile_size if self.autotile_paint else 0
+        self.mark((tile_pos[0] * self.tilemap.tile_size - render_scroll[0] - margin,
+                   tile_pos[1] * self.tilemap.tile_size - render_scroll[1] - margin,
+                   self.max_tile_size[0] + margin * 2, self.max_tile_size[1] + margin * 2))
+
+    def mark_offgrid(self, tile, render_scroll):
+        img = self.assets[tile['type']][tile['variant']]
+        self.mark(((tile['pos'][0] - render_scroll[0], tile['pos'][1] - render_scroll[1]), img.get_size()))
+
     def run(self):
         while True:
-            # Clear the Screen
-            self.display.fill((0, 0, 0))
-
             # Camera Movement
             self.scroll[0] += (self.movement[1] - self.movement[0]) * 2
             self.scroll[1] += (self.movement[3] - self.movement[2]) * 2
 
             # Truncated version of scroll
             render_scroll = (int(self.scroll[0]), int(self.scroll[1]))
-
-            self.tilemap.render(self.display, offset=render_scroll)
+            if not DIRTY_RECTS or render_scroll != self.last_scroll:
+                # The whole view moved
+                self.dirty = None
+            self.last_scroll = render_scroll
 
             # Get mouse coordinates
             mpos = pygame.mouse.get_pos()
@@ -83,31 +133,19 @@ class Editor:
             tile_pos = (int((mpos[0] + self.scroll[0]) // self.tilemap.tile_size),
                         int((mpos[1] + self.scroll[1]) // self.tilemap.tile_size))
 
-            # Get the current tile image
-            current_tile_img = self.assets[self.tile_list[self.tile_group]][self.tile_variant].copy()
-            current_tile_img.set_alpha(100)
-
-            if self.ongrid:
-                # Add overlay/sign where the tile will be placed in the grid
-                self.display.blit(current_tile_img, (tile_pos[0] * self.tilemap.tile_size - self.scroll[0],
-                                                     tile_pos[1] * self.tilemap.tile_size - self.scroll[1]))
-            else:
-                self.display.blit(current_tile_img, mpos)
-
             if self.clicking and self.ongrid:
-                self.tilemap.tilemap[str(tile_pos[0]) + ';' + str(tile_pos[1])] = {
-                    'type': self.tile_list[self.tile_group], 'variant': self.tile_variant, 'pos': tile_pos}
+                self.tilemap.set_tile(tile_pos, self.tile_list[self.tile_group], self.tile_variant)
+                if self.autotile_paint:
+                    self.tilemap.autotile_cells([tile_pos])
+                self.mark_tile(tile_pos, render_scroll)
             if self.right_clicking:
-                tile_loc = str(tile_pos[0]) + ';' + str(tile_pos[1])
-                if tile_loc in self.tilemap.tilemap:
-                    del self.tilemap.tilemap[tile_loc]
-                for tile in self.tilemap.offgrid_tiles.copy():
-                    tile_img = self.assets[tile['type']][tile['variant']]
-                    tile_r = pygame.Rect(tile['pos'][0] - self.scroll[0], tile['pos'][1] - self.scroll[1], tile_img.get_width(), tile_img.get_height())
-                    if tile_r.collidepoint(mpos):
-                        self.tilemap.offgrid_tiles.remove(tile)
-
-            self.display.blit(current_tile_img, (5, 5))
+                if self.tilemap.remove_tile(tile_pos):
+                    if self.autotile_paint:
+                        self.tilemap.autotile_cells([tile_pos])
+                    self.mark_tile(tile_pos, render_scroll)
+                for tile in self.tilemap.offgrid_at((mpos[0] + self.scroll[0], mpos[1] + self.scroll[1])):
+                    self.mark_offgrid(tile, render_scroll)
+                    self.tilemap.remove_offgrid(tile)
 
             # Loop for All type of Events
             for event in pygame.event.get():
@@ -115,13 +153,17 @@ class Editor:
                     pygame.quit()
                     sys.exit()
 
+                if event.type == pygame.WINDOWEXPOSED:
+                    self.dirty = None
+
                 if event.type == pygame.MOUSEBUTTONDOWN:
                     if event.button == 1:
                         self.clicking = True
                         if not self.ongrid:
-                            self.tilemap.offgrid_tiles.append(
-                                {'type': self.tile_list[self.tile_group], 'variant': self.tile_variant,
-                                 'pos': (mpos[0] + self.scroll[0], mpos[1] + self.scroll[1])})
+                            tile = {'type': self.tile_list[self.tile_group], 'variant': self.tile_variant,
+                                    'pos': (mpos[0] + self.scroll[0], mpos[1] + self.scroll[1])}
+                            self.tilemap.add_offgrid(tile)
+                            self.mark_offgrid(tile, render_scroll)
                     if event.button == 3:
                         self.right_clicking = True
                     if self.shift:
@@ -160,6 +202,9 @@ class Editor:
                         self.tilemap.save('map.json')
                     if event.key == pygame.K_t:
                         self.tilemap.autotile()
+                        self.dirty = None
+                    if event.key == pygame.K_p:
+                        self.autotile_paint = not self.autotile_paint
                     if event.key == pygame.K_LSHIFT:
                         self.shift = True
                 if event.type == pygame.KEYUP:
@@ -174,12 +219,52 @@ class Editor:
                     if event.key == pygame.K_LSHIFT:
                         self.shift = False
 
-            # Blit the display into the screen
-            self.screen.blit(pygame.transform.scale(self.display, self.screen.get_size()), (0, 0))
-            # Method to update the screen every frame
-            pygame.display.update()
+            # Preview of the selected tile where it will be placed and in the corner
+            current_tile_img = self.preview()
+            if self.ongrid:
+                preview_pos = (tile_pos[0] * self.tilemap.tile_size - self.scroll[0],
+                               tile_pos[1] * self.tilemap.tile_size - self.scroll[1])
+            else:
+                preview_pos = mpos
+            self.render(render_scroll, [(current_tile_img, preview_pos), (current_tile_img, (5, 5))])
             self.clock.tick(60)
 
+    # Do the changed areas span most of the display, then one full redraw is cheaper than one per area
+    def covers_view(self, union):
+        return union.w * union.h >= FULL_REDRAW_AREA * self.display.get_width() * self.display.get_height()
+
+    # Redraw the changed areas of the display and put only those on the screen
+    def render(self, render_scroll, overlays):
+        display_rect = self.display.get_rect()
+        overlay_rects = [pygame.Rect(pos, img.get_size()) for img, pos in overlays]
+        if self.dirty is None:
+            dirty = [display_rect]
+        else:
+            for old, new, old_rect, new_rect in zip(self.last_overlays, overlays, self.last_overlay_rects,
+                                                    overlay_rects):
+                if old != new:
+                    # A preview moved or changed, clear where it was and draw where it is
+                    self.dirty += [old_rect, new_rect]
+            dirty = [rect.clip(display_rect) for rect in self.dirty]
+            dirty = [rect for rect in dirty if rect.w and rect.h]
+            if len(dirty) > MAX_DIRTY_RECTS or (dirty and self.covers_view(dirty[0].unionall(dirty[1:]))):
+                dirty = [display_rect]
+        self.dirty = []
+        self.last_overlays = overlays
+        self.last_overlay_rects = overlay_rects
+        if not dirty:
+            # Nothing changed, the screen already shows this frame
+            return
+
+        for rect in dirty:
+            # Clipped to the area and only drawing the chunks and tiles in it, so each area costs what it covers
+            self.display.set_clip(rect)
+            self.display.fill((0, 0, 0))
+            self.tilemap.render(self.display, offset=render_scroll, area=rect)
+            self.display.blits(overlays, doreturn=False)
+        self.display.set_clip(None)
+        self.presenter.present_rects(self.display, dirty)
+
 
 # Initialize the Editor
 Editor().run()
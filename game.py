@@ -1,18 +1,44 @@
-import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 import pygame
 import math
 import random
 
 from scripts.utils import load_image, load_images, Animation, scaled_loader, scaler
-from scripts.entities import Player, Enemy, Goblin, Mushroom, Skeleton
+from scripts.entities import Player
+from scripts.enemies import EnemySystem
 from scripts.tilemap import Tilemap
+from scripts.levelfile import level_path, level_count
 from scripts.clouds import Clouds
-from scripts.particle import Particle
-from scripts.spark import Spark
+from scripts.outline import Outline
+from scripts.overlay import OverlayCache
+from scripts.parallax import Parallax, ParallaxLayer
+from scripts.present import Presenter
+from scripts.particle import ParticleSystem
+from scripts.projectile import ProjectilePool
+from scripts.spark import SparkSystem
+from scripts.text import TextCache
 from menu import Menu
 
+# Chunks kept loaded around the view on levels big enough to be streamed
+STREAM_WINDOW = 1
+
+# The game always steps at 60 per second (the physics constants are per step), rendering runs as fast
+# as it can up to FPS_LIMIT and at most MAX_STEPS are run per rendered frame to catch up
+STEP_TIME = 1 / 60
+MAX_STEPS = 5
+FPS_LIMIT = 144
+
+# Background images back to front with their parallax depth (0 stays on screen, 1 moves with the level)
+BACKGROUND_LAYERS = [('background', 0), ('background_0', 0), ('background_1', 0)]
+
+# Outline around the level and sprites, 'full' or 'off'
+OUTLINE_QUALITY = 'full'
+
+# How the frame is scaled to the screen, 'stretch', 'integer', 'fit' or 'scaled' (see scripts/present.py)
+PRESENT_MODE = 'stretch'
+
 
 class Game:
     def __init__(self):
@@ -22,16 +48,24 @@ class Game:
         pygame.display.set_caption('Onegai My Kuromi')
 
         # Change window resolution
-        self.screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+        self.presenter = Presenter((320, 240), PRESENT_MODE)
+        self.screen = self.presenter.screen
 
         # Initialize second surface for rendering (used for asset scaling)
         self.display = pygame.Surface((320, 240), pygame.SRCALPHA)
 
         # Display for outlines
         self.display_2 = pygame.Surface((320, 240))
+        self.outline = Outline(self.display.get_size(), OUTLINE_QUALITY)
+        # Full-screen effect surfaces (transitions, menu overlay)
+        self.overlays = OverlayCache(self.display.get_size())
+        # Fonts and rendered text (menus)
+        self.text = TextCache()
 
         # initialize game clock
         self.clock = pygame.time.Clock()
+        # Time not simulated yet, in seconds
+        self.accumulator = 0
 
         # Movement variable
         self.movement = [False, False]
@@ -95,6 +129,10 @@ class Game:
         self.sfx['roar'].set_volume(0.5)
         self.sfx['final'].set_volume(0.7)
 
+        # Background layers, scaled to the display once (layers with the same depth end up merged into one)
+        self.background = Parallax([ParallaxLayer(pygame.transform.scale(self.assets[name], self.display_2.get_size()),
+                                                  depth=depth, tile=True) for name, depth in BACKGROUND_LAYERS])
+
         # Define Clouds
         self.clouds = Clouds(self.assets['clouds'], count=16)
 
@@ -106,6 +144,19 @@ class Game:
 
         # Level variable for level transition
         self.level = 0
+        self.level_count = level_count('data/maps')
+
+        # Particles and sparks of the level
+        self.particles = ParticleSystem(self)
+        self.sparks = SparkSystem()
+
+        # Projectiles fired by enemies and by the player
+        self.projectiles = ProjectilePool()
+        self.player_projectiles = ProjectilePool()
+
+        # Levels are prepared in the background during transitions, map_id -> future of the pending ones
+        self.loader = ThreadPoolExecutor(max_workers=1)
+        self.next_levels = {}
         self.load_level(self.level)
 
         # Screen shake values
@@ -118,37 +169,65 @@ class Game:
         # Main Menu
         self.game_state = 'menu'
 
+    # Read a level into a fresh Tilemap and pull out its spawners
+    # Doesn't touch the running game, so it's safe to run on the loader thread
+    def prepare_level(self, map_id):
+        tilemap = Tilemap(self, tile_size=14)
+        tilemap.load(level_path('data/maps', map_id), stream_window=STREAM_WINDOW)
+        if tilemap.stream:
+            # Streamed level, enemies get spawned as the camera gets close (see update_stream)
+            spawners = tilemap.take_spawners(variants=[0])
+        else:
+            spawners = tilemap.extract([('spawners', 0), ('spawners', 1), ('spawners', 2), ('spawners', 3),
+                                        ('spawners', 4)])
+        return tilemap, spawners
+
+    # Start preparing a level in the background (reuses the job if it's already being prepared)
+    # Jobs for any other level aren't wanted anymore and get cancelled
+    def prefetch_level(self, map_id):
+        self.drop_prefetched(keep=map_id)
+        if map_id not in self.next_levels:
+            self.next_levels[map_id] = self.loader.submit(self.prepare_level, map_id)
+
+    # Cancel pending level jobs (except keep), one that already started just finishes and gets dropped
+    def drop_prefetched(self, keep=None):
+        for map_id in [map_id for map_id in self.next_levels if map_id != keep]:
+            self.next_levels.pop(map_id).cancel()
+
     def load_level(self, map_id):
-        self.tilemap.load('data/maps/' + str(map_id) + '.json')
+        # Use the prefetched level if there is one, the swap below happens all at once on this thread
+        future = self.next_levels.pop(map_id, None)
+        if future is not None and not future.cancelled():
+            tilemap, spawners = future.result()
+        else:
+            tilemap, spawners = self.prepare_level(map_id)
+        self.drop_prefetched()
+        self.tilemap = tilemap
+
+        # Player and enemy spawners
+        self.enemies = EnemySystem(self)
+        # Enemies of chunks that were streamed out, chunk_loc -> their state from EnemySystem.take
+        self.parked_enemies = {}
+        for spawner in spawners:
+            self.spawn(spawner)
 
         # Add leaves to trees
-        self.leaf_spawners = []
-        for i in range(2, 5):
-            for tree in self.tilemap.extract([('large_decor', i)], keep=True):
-                self.leaf_spawners.append(pygame.Rect(4 + tree['pos'][0], 4 + tree['pos'][1], 23, 13))
+        self.leaf_spawners = self.find_leaf_spawners()
 
-        # Player and enemy spawners
-        self.enemies = []
-        for spawner in self.tilemap.extract([('spawners', 0), ('spawners', 1), ('spawners', 2), ('spawners', 3), ('spawners', 4)]):
-            if spawner['variant'] == 0:
-                self.player.pos = spawner['pos']
-                self.player.air_time = 0
-            elif spawner['variant'] == 1:
-                self.enemies.append(Enemy(self, spawner['pos'], (8, 15)))
-            elif spawner['variant'] == 2:
-                self.enemies.append(Goblin(self, spawner['pos'], (8, 15)))
-            elif spawner['variant'] == 3:
-                self.enemies.append(Mushroom(self, spawner['pos'], (8, 15)))
-            elif spawner['variant'] == 4:
-                self.enemies.append(Skeleton(self, spawner['pos'], (8, 15)))
-
-        self.particles = []
-        self.projectiles = []
-        self.player_projectiles = []
-        self.sparks = []
+        self.particles.clear()
+        self.projectiles.clear()
+        self.player_projectiles.clear()
+        self.sparks.clear()
 
         # Add Camera
         self.scroll = [0, 0]
+        self.prev_scroll = [0, 0]
+        if self.tilemap.stream:
+            # Start on the player, the camera would otherwise fly over chunks that aren't loaded
+            self.scroll = [self.player.rect().centerx - self.display.get_width() / 2,
+                           self.player.rect().centery - self.display.get_height() / 2]
+            self.prev_scroll = list(self.scroll)
+            self.update_stream(self.scroll)
 
         # Allows the user to be dead
         self.dead = 0
@@ -156,6 +235,239 @@ class Game:
         # Transition variable
         self.transition = -30
 
+    # Create what a spawner stands for
+    def spawn(self, spawner):
+        if spawner['variant'] == 0:
+            self.player.pos = spawner['pos']
+            self.player.prev_pos = list(spawner['pos'])
+            self.player.air_time = 0
+        else:
+            # Enemy spawner variants start at 1, archetypes at 0
+            self.enemies.spawn(spawner['variant'] - 1, spawner['pos'])
+
+    def find_leaf_spawners(self):
+        leaf_spawners = []
+        for i in range(2, 5):
+            for tree in self.tilemap.extract([('large_decor', i)], keep=True):
+                leaf_spawners.append(pygame.Rect(4 + tree['pos'][0], 4 + tree['pos'][1], 23, 13))
+        return leaf_spawners
+
+    # Stream chunks in and out around the camera, parking the enemies of chunks that leave
+    def update_stream(self, scroll):
+        loaded, evicted = self.tilemap.update_stream(
+            (scroll[0], scroll[1], self.display.get_width(), self.display.get_height()))
+        for chunk_loc in evicted:
+            in_chunk = self.enemies.in_chunk(self.tilemap, chunk_loc)
+            if in_chunk.any():
+                self.parked_enemies[chunk_loc] = self.enemies.take(in_chunk)
+        for chunk_loc in loaded:
+            if chunk_loc in self.parked_enemies:
+                self.enemies.restore(self.parked_enemies.pop(chunk_loc))
+        for spawner in self.tilemap.take_spawners(loaded):
+            self.spawn(spawner)
+        if loaded or evicted:
+            self.leaf_spawners = self.find_leaf_spawners()
+
+    # Enemies that still have to be killed, including parked and not yet spawned ones
+    def enemies_left(self):
+        return len(self.enemies) + sum(len(state['archetype']) for state in self.parked_enemies.values()) + \
+            self.tilemap.dormant_count()
+
+    # Projectile hit on the player
+    def hit_player(self, deadly):
+        if deadly:
+            # Player death logic
+            self.dead += 1
+        # Add sound when hit
+        self.sfx['hit'].play()
+        # Add screenshake when the player died
+        self.screenshake = max(16, self.screenshake)
+        # Sparks when the projectile hit the player
+        for i in range(30):
+            angle = random.random() * math.pi * 2
+            speed = random.random() * 5
+            self.sparks.add(self.player.rect().center, angle, 2 + random.random(), (255, 0, 0))
+            self.particles.add('particle', self.player.rect().center,
+                               velocity=(math.cos(angle + math.pi) * speed * 0.5,
+                                         math.sin(angle + math.pi) * speed * 0.5),
+                               frame=random.randint(0, 7))
+
+    # One fixed step of the game (STEP_TIME long)
+    def update(self):
+        # Where things were before this step, render interpolates from there
+        self.prev_scroll = list(self.scroll)
+
+        # Add screenshake
+        self.screenshake = max(0, self.screenshake - 1)
+
+        # Prepare the level that's coming up, only one per step: the next one while the transition runs,
+        # otherwise this one again for the respawn
+        cleared = not self.enemies_left()
+        if cleared:
+            self.prefetch_level(min(self.level + 1, self.level_count - 1))
+        elif self.dead:
+            self.prefetch_level(self.level)
+
+        # Handles level transition
+        if cleared:
+            self.transition += 1
+            if self.transition > 30:
+                # Added limit to levels
+                self.level = min(self.level + 1, self.level_count - 1)
+                self.load_level(self.level)
+                if self.level == self.level_count - 1:
+                    self.sfx['victory'].play()
+                    self.sfx['intro'].play()
+            elif self.level == self.level_count - 2:
+                    self.sfx['roar'].play()
+                    self.sfx['final'].play(-1)
+        if self.transition < 0:
+            self.transition += 1
+
+        # Revives the player after 40 frames
+        if self.dead:
+            self.dead += 1
+            if self.dead == 10:
+                self.transition = min(30, self.transition + 1)
+            if self.dead > 40:
+                self.load_level(self.level)
+
+        # Position the camera in the center of the screen (player)
+        self.scroll[0] += (self.player.rect().centerx - self.display.get_width() / 2 - self.scroll[0]) / 30
+        self.scroll[1] += (self.player.rect().centery - self.display.get_height() / 2 - self.scroll[1]) / 30
+        # Remove jittery shit
+        render_scroll = (int(self.scroll[0]), int(self.scroll[1]))
+        view = (render_scroll[0], render_scroll[1], self.display.get_width(), self.display.get_height())
+
+        if self.tilemap.stream:
+            self.update_stream(render_scroll)
+
+        # Spawn the leaf particles
+        for rect in self.leaf_spawners:
+            if random.random() * 49999 < rect.width * rect.height:
+                pos = (rect.x + random.random() * rect.width, rect.y + random.random() * rect.height)
+                self.particles.add('leaf', pos, velocity=(-0.1, 0.3), frame=random.randint(0, 20))
+
+        self.clouds.update()
+
+        self.enemies.update(self.tilemap, view=view)
+
+        if not self.dead:
+            self.player.update(self.tilemap, (self.movement[1] - self.movement[0], 0))
+
+        # Move the projectiles, both kinds run on the same pool
+        for projectiles in (self.projectiles, self.player_projectiles):
+            for pos, speed, color in projectiles.update(self.tilemap):
+                # Spawn spark when a wall is hit
+                for i in range(12):
+                    self.sparks.add(pos, random.random() - 0.5 + (math.pi if speed > 0 else 0),
+                                    2 + random.random(), color)
+
+        # Projectiles hitting the player, only the enemies' ones kill
+        if abs(self.player.dashing) < 50:
+            for projectiles, deadly in ((self.projectiles, True), (self.player_projectiles, False)):
+                for slot in projectiles.inside(self.player.rect()):
+                    projectiles.kill(slot)
+                    self.hit_player(deadly)
+
+        self.sparks.update()
+        self.particles.update()
+
+    # Draw the game, alpha is how far the frame is between the last two steps (0 to 1)
+    def render(self, alpha=1):
+        # Camera between the last two steps, without the jitter
+        render_scroll = (int(self.prev_scroll[0] + (self.scroll[0] - self.prev_scroll[0]) * alpha),
+                         int(self.prev_scroll[1] + (self.scroll[1] - self.prev_scroll[1]) * alpha))
+
+        # Add transparency to display
+        self.display.fill((0, 0, 0, 0))
+        # Clear the Screen
+        self.background.render(self.display_2, offset=render_scroll)
+
+        # Render Clouds
+        self.clouds.render(self.display_2, offset=render_scroll)
+
+        # Everything drawn with the outline gets its silhouette collected for the outline pass
+        self.outline.begin(self.display_2)
+
+        # Render tile map
+        self.tilemap.render(self.display, offset=render_scroll, outline=self.outline)
+
+        # Render the enemies
+        self.enemies.render(self.display, offset=render_scroll, alpha=alpha, outline=self.outline)
+
+        if not self.dead:
+            # Render Player
+            self.player.render(self.display, offset=render_scroll, alpha=alpha, outline=self.outline)
+
+        # Render projectiles
+        self.projectiles.render(self.display, offset=render_scroll, alpha=alpha, outline=self.outline)
+        self.player_projectiles.render(self.display, offset=render_scroll, alpha=alpha, outline=self.outline)
+
+        # Render the sparks
+        self.sparks.render(self.display, offset=render_scroll, outline=self.outline)
+
+        # Game outline, drawn under the display
+        self.outline.finish()
+
+        # Render the particles
+        self.particles.render(self.display, offset=render_scroll)
+
+        # Transition visuals
+        if self.transition:
+            self.display.blit(self.overlays.iris((30 - abs(self.transition)) * 8), (0, 0))
+
+        self.display_2.blit(self.display, (0, 0))
+
+        screenshake_offset = (random.random() * self.screenshake - self.screenshake / 2,
+                              random.random() * self.screenshake - self.screenshake / 2)
+        # Scale the display onto the screen and show it
+        self.presenter.present(self.display_2, screenshake_offset)
+
+    def handle_events(self):
+        # Loop for All type of Events
+        for event in pygame.event.get():
+            # Keyboard Controls
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    pygame.quit()
+                    sys.exit()
+                if event.key == pygame.K_a or event.key == pygame.K_LEFT:
+                    self.movement[0] = True
+                if event.key == pygame.K_d or event.key == pygame.K_RIGHT:
+                    self.movement[1] = True
+                if event.key == pygame.K_w or event.key == pygame.K_SPACE or event.key == pygame.K_UP:
+                    if self.player.jump():
+                        self.sfx['jump'].play()
+                        self.screenshake = max(5, self.screenshake)
+                if event.key == pygame.K_x:
+                    self.player.dash()
+                if event.key == pygame.K_c:
+                    self.player.shoot()
+            if event.type == pygame.KEYUP:
+                if event.key == pygame.K_a or event.key == pygame.K_LEFT:
+                    self.movement[0] = False
+                if event.key == pygame.K_d or event.key == pygame.K_RIGHT:
+                    self.movement[1] = False
+
+            # Mouse controls
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                if event.button == 1:
+                    self.clicking = True
+                    self.player.shoot()
+                if event.button == 3:
+                    self.right_clicking = True
+                    self.player.dash()
+
+            if event.type == pygame.MOUSEBUTTONUP:
+                if event.button == 1:
+                    self.clicking = False
+                if event.button == 3:
+                    self.right_clicking = False
+                    self.player.dash()
 
     def run(self):
         # Add music
@@ -173,10 +485,8 @@ class Game:
             if self.game_state == 'menu':
                 # Render menu
                 self.display.fill((0, 0, 0))
-                font = pygame.font.Font(None, 35)
-                font_2 = pygame.font.Font(None, 15)
-                title = font.render('Onegai My Kuromi', False, (255, 255, 255))
-                start_text = font_2.render('Press SPACE to Start', True, (255, 255, 255))
+                title = self.text.render('Onegai My Kuromi', 35, (255, 255, 255), False)
+                start_text = self.text.render('Press SPACE to Start', 15, (255, 255, 255))
 
                 self.display.blit(title, (self.display.get_width() // 2 - title.get_width() // 2, 100))
 
@@ -203,234 +513,21 @@ class Game:
                             sys.exit()
 
                 # Update display
-                self.screen.blit(pygame.transform.scale(self.display, self.screen.get_size()), (0, 0))
-                pygame.display.update()
+                self.presenter.present(self.display)
                 self.clock.tick(60)
             if self.game_state == 'playing':
-                # Add transparency to display
-                self.display.fill((0, 0, 0, 0))
-                # Clear the Screen
-                self.display_2.blit(pygame.transform.scale(self.assets['background'], (320, 240)), (0, 0))
-                self.display_2.blit(pygame.transform.scale(self.assets['background_0'], (320, 240)), (0, 0))
-                self.display_2.blit(pygame.transform.scale(self.assets['background_1'], (320, 240)), (0, 0))
-
-                # Add screenshake
-                self.screenshake = max(0, self.screenshake - 1)
-
-                # Handles level transition
-                if not len(self.enemies):
-                    self.transition += 1
-                    if self.transition > 30:
-                        # Added limit to levels
-                        self.level = min(self.level + 1, len(os.listdir('data/maps')) - 1)
-                        self.load_level(self.level)
-                        if self.level == len(os.listdir('data/maps')) - 1:
-                            self.sfx['victory'].play()
-                            self.sfx['intro'].play()
-                    elif self.level == len(os.listdir('data/maps')) - 2:
-                            self.sfx['roar'].play()
-                            self.sfx['final'].play(-1)
-                if self.transition < 0:
-                    self.transition += 1
-
-                # Revives the player after 40 frames
-                if self.dead:
-                    self.dead += 1
-                    if self.dead == 10:
-                        self.transition = min(30, self.transition + 1)
-                    if self.dead > 40:
-                        self.load_level(self.level)
-
-                # Position the camera in the center of the screen (player)
-                self.scroll[0] += (self.player.rect().centerx - self.display.get_width() / 2 - self.scroll[0]) / 30
-                self.scroll[1] += (self.player.rect().centery - self.display.get_height() / 2 - self.scroll[1]) / 30
-                # Remove jittery shit
-                render_scroll = (int(self.scroll[0]), int(self.scroll[1]))
-
-                # Spawn the leaf particles
-                for rect in self.leaf_spawners:
-                    if random.random() * 49999 < rect.width * rect.height:
-                        pos = (rect.x + random.random() * rect.width, rect.y + random.random() * rect.height)
-                        self.particles.append(
-                            Particle(self, 'leaf', pos, velocity=[-0.1, 0.3], frame=random.randint(0, 20)))
-
-                # Render Clouds
-                self.clouds.update()
-                self.clouds.render(self.display_2, offset=render_scroll)
-
-                # Render tile map
-                self.tilemap.render(self.display, offset=render_scroll)
-
-                # Render the enemies
-                for enemy in self.enemies.copy():
-                    kill = enemy.update(self.tilemap, (0, 0))
-                    enemy.render(self.display, offset=render_scroll)
-                    if kill:
-                        self.enemies.remove(enemy)
-
-                if not self.dead:
-                    # Update pos
-                    self.player.update(self.tilemap, (self.movement[1] - self.movement[0], 0))
-                    # Render Player
-                    self.player.render(self.display, offset=render_scroll)
-
-                # Render projectiles
-                # [[x, y], direction, timer]
-                for projectile in self.projectiles.copy():
-                    projectile[0][0] += projectile[1]
-                    projectile[2] += 1
-                    img = projectile[3]
-                    color = projectile[4]
-                    self.display.blit(img, (projectile[0][0] - img.get_width() / 2 - render_scroll[0],
-                                            projectile[0][1] - img.get_height() / 2 - render_scroll[1]))
-                    if self.tilemap.solid_check(projectile[0]):
-                        self.projectiles.remove(projectile)
-                        # Spawn spark when a wall is hit
-                        for i in range(12):
-                            self.sparks.append(
-                                Spark(projectile[0], random.random() - 0.5 + (math.pi if projectile[1] > 0 else 0),
-                                      2 + random.random(), color))
-                    elif projectile[2] > 360:
-                        self.projectiles.remove(projectile)
-                    elif abs(self.player.dashing) < 50:
-                        if self.player.rect().collidepoint(projectile[0]):
-                            self.projectiles.remove(projectile)
-                            # Player death logic
-                            self.dead += 1
-                            # Add sound when hit
-                            self.sfx['hit'].play()
-                            # Add screenshake when the player died
-                            self.screenshake = max(16, self.screenshake)
-                            # Sparks when the projectile hit the player
-                            for i in range(30):
-                                angle = random.random() * math.pi * 2
-                                speed = random.random() * 5
-                                self.sparks.append(
-                                    Spark(self.player.rect().center, angle, 2 + random.random(), (255, 0, 0)))
-                                self.particles.append(Particle(self, 'particle', self.player.rect().center,
-                                                               velocity=[math.cos(angle + math.pi) * speed * 0.5,
-                                                                         math.sin(angle + math.pi) * speed * 0.5],
-                                                               frame=random.randint(0, 7)))
-
-                # Render Player Projectiles
-                for projectile in self.player_projectiles.copy():
-                    projectile[0][0] += projectile[1]
-                    projectile[2] += 1
-                    img = projectile[3]
-                    color = projectile[4]
-                    self.display.blit(img, (projectile[0][0] - img.get_width() / 2 - render_scroll[0],
-                                            projectile[0][1] - img.get_height() / 2 - render_scroll[1]))
-                    if self.tilemap.solid_check(projectile[0]):
-                        self.player_projectiles.remove(projectile)
-                        # Spawn spark when a wall is hit
-                        for i in range(12):
-                            self.sparks.append(
-                                Spark(projectile[0], random.random() - 0.5 + (math.pi if projectile[1] > 0 else 0),
-                                      2 + random.random(), color))
-                    elif projectile[2] > 360:
-                        self.player_projectiles.remove(projectile)
-                    elif abs(self.player.dashing) < 50:
-                        if self.player.rect().collidepoint(projectile[0]):
-                            self.player_projectiles.remove(projectile)
-                            # Add sound when hit
-                            self.sfx['hit'].play()
-                            # Add screenshake when the player died
-                            self.screenshake = max(16, self.screenshake)
-                            # Sparks when the projectile hit the player
-                            for i in range(30):
-                                angle = random.random() * math.pi * 2
-                                speed = random.random() * 5
-                                self.sparks.append(
-                                    Spark(self.player.rect().center, angle, 2 + random.random(), (255, 0, 0)))
-                                self.particles.append(Particle(self, 'particle', self.player.rect().center,
-                                                               velocity=[math.cos(angle + math.pi) * speed * 0.5,
-                                                                         math.sin(angle + math.pi) * speed * 0.5],
-                                                               frame=random.randint(0, 7)))
-
-                # Render the sparks
-                for spark in self.sparks.copy():
-                    kill = spark.update()
-                    spark.render(self.display, offset=render_scroll)
-                    if kill:
-                        self.sparks.remove(spark)
-
-                # Make a mask for game outline
-                display_mask = pygame.mask.from_surface(self.display)
-                display_sillhouette = display_mask.to_surface(setcolor=(0, 0, 0, 180), unsetcolor=(0, 0, 0, 0))
-                for offset in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                    self.display_2.blit(display_sillhouette, offset)
-
-                # Render the particles and check if it needs to be removed
-                for particle in self.particles.copy():
-                    kill = particle.update()
-                    particle.render(self.display, offset=render_scroll)
-                    if particle.type == 'leaf':
-                        particle.pos[0] += math.sin(particle.animation.frame * 0.035) * 0.3
-                    if kill:
-                        self.particles.remove(particle)
-
-                # Loop for All type of Events
-                for event in pygame.event.get():
-                    # Keyboard Controls
-                    if event.type == pygame.QUIT:
-                        pygame.quit()
-                        sys.exit()
-                    if event.type == pygame.KEYDOWN:
-                        if event.key == pygame.K_ESCAPE:
-                            pygame.quit()
-                            sys.exit()
-                        if event.key == pygame.K_a or event.key == pygame.K_LEFT:
-                            self.movement[0] = True
-                        if event.key == pygame.K_d or event.key == pygame.K_RIGHT:
-                            self.movement[1] = True
-                        if event.key == pygame.K_w or event.key == pygame.K_SPACE or event.key == pygame.K_UP:
-                            if self.player.jump():
-                                self.sfx['jump'].play()
-                                self.screenshake = max(5, self.screenshake)
-                        if event.key == pygame.K_x:
-                            self.player.dash()
-                        if event.key == pygame.K_c:
-                            self.player.shoot()
-                    if event.type == pygame.KEYUP:
-                        if event.key == pygame.K_a or event.key == pygame.K_LEFT:
-                            self.movement[0] = False
-                        if event.key == pygame.K_d or event.key == pygame.K_RIGHT:
-                            self.movement[1] = False
-
-                    # Mouse controls
-                    if event.type == pygame.MOUSEBUTTONDOWN:
-                        if event.button == 1:
-                            self.clicking = True
-                            self.player.shoot()
-                        if event.button == 3:
-                            self.right_clicking = True
-                            self.player.dash()
-
-                    if event.type == pygame.MOUSEBUTTONUP:
-                        if event.button == 1:
-                            self.clicking = False
-                        if event.button == 3:
-                            self.right_clicking = False
-                            self.player.dash()
-
-                # Transition visuals
-                if self.transition:
-                    transition_surf = pygame.Surface(self.display.get_size())
-                    pygame.draw.circle(transition_surf, (255, 255, 255),
-                                       (self.display.get_width() // 2, self.display.get_height() // 2),
-                                       (30 - abs(self.transition)) * 8)
-                    transition_surf.set_colorkey((255, 255, 255))
-                    self.display.blit(transition_surf, (0, 0))
-
-                self.display_2.blit(self.display, (0, 0))
-
-                screenshake_offset = (random.random() * self.screenshake - self.screenshake / 2,
-                                      random.random() * self.screenshake - self.screenshake / 2)
-                # Blit the display into the screen
-                self.screen.blit(pygame.transform.scale(self.display_2, self.screen.get_size()), screenshake_offset)
-                # Method to update the screen every frame
-                pygame.display.update()
-                self.clock.tick(60)
-
+                # Run as many fixed steps as the time since the last frame covers, then draw once
+                self.accumulator += self.clock.tick(FPS_LIMIT) / 1000
+                self.handle_events()
+                steps = 0
+                while self.accumulator >= STEP_TIME and steps < MAX_STEPS:
+                    self.update()
+                    self.accumulator -= STEP_TIME
+                    steps += 1
+                if steps == MAX_STEPS:
+                    # Too far behind to catch up, let the game slow down instead of spiralling
+                    self.accumulator = min(self.accumulator, STEP_TIME)
+                # How far between the last two steps this frame is
+                self.render(self.accumulator / STEP_TIME)
 
 Game().run()
@@ -36,9 +36,9 @@ class Menu:
         # Selected option index
         self.selected_option = 0
 
-        # Font setup
-        self.font = pygame.font.Font(None, 36)
-        self.selected_font = pygame.font.Font(None, 42)
+        # Font sizes, text is rendered through the game's text cache
+        self.font_size = 36
+        self.selected_font_size = 42
 
         # Colors
         self.WHITE = (255, 255, 255)
@@ -129,9 +129,7 @@ class Menu:
         :param display: Pygame surface to render menu on
         """
         # Fill background with a semi-transparent overlay
-        overlay = pygame.Surface(display.get_size(), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 180))
-        display.blit(overlay, (0, 0))
+        display.blit(self.game.overlays.fill((0, 0, 0, 180), display.get_size()), (0, 0))
 
         # Render based on current state
         if self.current_state == self.STATE_MAIN_MENU:
@@ -155,10 +153,10 @@ class Menu:
         for i, option in enumerate(options):
             # Determine if this option is selected
             if i == self.selected_option:
-                text = self.selected_font.render(option, True, self.WHITE)
+                text = self.game.text.render(option, self.selected_font_size, self.WHITE)
                 text_rect = text.get_rect(center=(screen_width // 2, screen_height // 2 + i * 50))
             else:
-                text = self.font.render(option, True, self.GRAY)
+                text = self.game.text.render(option, self.font_size, self.GRAY)
                 text_rect = text.get_rect(center=(screen_width // 2, screen_height // 2 + i * 50))
 
             display.blit(text, text_rect)
@@ -181,10 +179,10 @@ class Menu:
         for i, option in enumerate(options):
             # Determine if this option is selected
             if i == self.selected_option:
-                text = self.selected_font.render(option, True, self.WHITE)
+                text = self.game.text.render(option, self.selected_font_size, self.WHITE)
                 text_rect = text.get_rect(center=(screen_width // 2, screen_height // 2 + i * 50))
             else:
-                text = self.font.render(option, True, self.GRAY)
+                text = self.game.text.render(option, self.font_size, self.GRAY)
                 text_rect = text.get_rect(center=(screen_width // 2, screen_height // 2 + i * 50))
 
             display.blit(text, text_rect)
@@ -211,6 +209,6 @@ class Menu:
         ]
 
         for i, line in enumerate(credits):
-            text = self.font.render(line, True, self.WHITE)
+            text = self.game.text.render(line, self.font_size, self.WHITE)
             text_rect = text.get_rect(center=(screen_width // 2, screen_height // 2 + i * 30 - len(credits) * 15))
             display.blit(text, text_rect)
\ No newline at end of file
@@ -0,0 +1,231 @@
+import pygame
+import numpy as np
+
+NEIGHBOR_OFFSETS = [(-1, 0), (-1, -1), (0, -1), (1, -1), (1, 0), (0, 0), (-1, 1), (0, 1), (1, 1)]
+
+# Extra tiles added on each side when the grid has to grow (only happens while editing)
+GROW_MARGIN = 16
+
+# Cell size of the broad-phase grid, a bit bigger than enemies and projectiles
+BROADPHASE_CELL = 32
+
+
+class SolidGrid:
+    """
+    Which grid cells are solid, as one byte per cell over the map's bounding box.
+
+    The bytes live in a bytearray (fast single lookups from Python) that is shared with a
+    numpy view (batch lookups for many points at once).
+    """
+
+    def __init__(self, tile_size, origin=(0, 0), width=0, height=0):
+        self.tile_size = tile_size
+        self.allocate(origin, width, height)
+
+        # Rects handed out by rects_around, reused every call instead of allocating new ones
+        self.rect_pool = [pygame.Rect(0, 0, tile_size, tile_size) for i in range(len(NEIGHBOR_OFFSETS))]
+
+    def allocate(self, origin, width, height):
+        self.origin = tuple(origin)
+        self.width = width
+        self.height = height
+        self.data = bytearray(width * height)
+        self.cells = np.frombuffer(self.data, dtype=np.uint8).reshape(height, width)
+
+    @classmethod
+    def from_level(cls, level, solid_types):
+        height, width = level.types.shape
+        grid = cls(level.tile_size, level.origin, width, height)
+        solid_ids = [i + 1 for i, name in enumerate(level.type_names) if name in solid_types]
+        grid.cells[:] = np.isin(level.types, solid_ids)
+        return grid
+
+    # Is the cell at a grid position solid
+    def solid(self, x, y):
+        x -= self.origin[0]
+        y -= self.origin[1]
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.data[y * self.width + x]
+        return 0
+
+    # Is the cell under a pixel position solid
+    def solid_at(self, pos):
+        return self.solid(int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
+
+    # Batch version of solid_at, takes arrays of pixel coordinates and returns a boolean array
+    def solid_mask(self, xs, ys):
+        gx = np.floor_divide(xs, self.tile_size).astype(np.int64) - self.origin[0]
+        gy = np.floor_divide(ys, self.tile_size).astype(np.int64) - self.origin[1]
+        inside = (gx >= 0) & (gx < self.width) & (gy >= 0) & (gy < self.height)
+        result = np.zeros(inside.shape, dtype=bool)
+        result[inside] = self.cells[gy[inside], gx[inside]] != 0
+        return result
+
+    # Sweep a rect (x, y, w, h) by (dx, dy) and find the first solid cell it runs into
+    # Returns (time of impact in 0..1, normal, edge) where edge is the coordinate the leading side stops at,
+    # or (1, None, None) if nothing is hit before the end of the movement
+    # Cells the rect already overlaps only stop movement that goes deeper into them
+    def sweep(self, rect, dx, dy):
+        x, y, w, h = rect
+        ts = self.tile_size
+        hit = (1, None, None)
+        for cy in range(int(min(y, y + dy) // ts), int(max(y + h, y + h + dy) // ts) + 1):
+            top = cy * ts
+            bottom = top + ts
+            for cx in range(int(min(x, x + dx) // ts), int(max(x + w, x + w + dx) // ts) + 1):
+                if not self.solid(cx, cy):
+                    continue
+                left = cx * ts
+                right = left + ts
+
+                # Times when the rect starts and stops overlapping the cell on each axis
+                if dx > 0:
+                    entry_x, exit_x = (left - x - w) / dx, (right - x) / dx
+                elif dx < 0:
+                    entry_x, exit_x = (right - x) / dx, (left - x - w) / dx
+                elif x < right and x + w > left:
+                    entry_x, exit_x = -float('inf'), float('inf')
+                else:
+                    continue
+                if dy > 0:
+                    entry_y, exit_y = (top - y - h) / dy, (bottom - y) / dy
+                elif dy < 0:
+                    entry_y, exit_y = (bottom - y) / dy, (top - y - h) / dy
+                elif y < bottom and y + h > top:
+                    entry_y, exit_y = -float('inf'), float('inf')
+                else:
+                    continue
+
+                entry = max(entry_x, entry_y)
+                if entry >= hit[0] or entry >= min(exit_x, exit_y):
+                    continue
+                if entry < 0:
+                    # Already overlapping (spawned a bit inside the floor for example), push out along the
+                    # axis with the least overlap but only when moving further in
+                    overlap_x = min(x + w - left, right - x)
+                    overlap_y = min(y + h - top, bottom - y)
+                    if overlap_x <= 0 or overlap_y <= 0:
+                        continue
+                    if overlap_y <= overlap_x:
+                        if dy > 0 and y + h / 2 < top + ts / 2:
+                            hit = (0, (0, -1), top)
+                        elif dy < 0 and y + h / 2 > top + ts / 2:
+                            hit = (0, (0, 1), bottom)
+                    elif dx > 0 and x + w / 2 < left + ts / 2:
+                        hit = (0, (-1, 0), left)
+                    elif dx < 0 and x + w / 2 > left + ts / 2:
+                        hit = (0, (1, 0), right)
+                    continue
+                if entry_x > entry_y:
+                    hit = (entry, (-1, 0), left) if dx > 0 else (entry, (1, 0), right)
+                else:
+                    hit = (entry, (0, -1), top) if dy > 0 else (entry, (0, 1), bottom)
+        return hit
+
+    # Move a rect (x, y, w, h) by (dx, dy), sliding along whatever it hits
+    # Returns the new (x, y) and the normals of everything that was hit
+    def move(self, rect, dx, dy, max_hits=3):
+        x, y, w, h = rect
+        normals = []
+        for i in range(max_hits):
+            if not dx and not dy:
+                break
+            time, normal, edge = self.sweep((x, y, w, h), dx, dy)
+            if normal is None:
+                return (x + dx, y + dy), normals
+            normals.append(normal)
+            # Stop exactly at the edge on the axis that was hit and keep the rest of the movement on the other one
+            if normal[0]:
+                x = edge - w if normal[0] < 0 else edge
+                y += dy * time
+                dx, dy = 0, dy * (1 - time)
+            else:
+                y = edge - h if normal[1] < 0 else edge
+                x += dx * time
+                dx, dy = dx * (1 - time), 0
+        return (x, y), normals
+
+    # Rects of the solid tiles in the 3x3 area around a pixel position
+    # The rects are reused on the next call, so they shouldn't be kept around
+    def rects_around(self, pos):
+        tile_x = int(pos[0] // self.tile_size)
+        tile_y = int(pos[1] // self.tile_size)
+        rects = []
+        for offset in NEIGHBOR_OFFSETS:
+            if self.solid(tile_x + offset[0], tile_y + offset[1]):
+                rect = self.rect_pool[len(rects)]
+                rect.x = (tile_x + offset[0]) * self.tile_size
+                rect.y = (tile_y + offset[1]) * self.tile_size
+                rects.append(rect)
+        return rects
+
+    def set(self, x, y, solid):
+        if not (0 <= x - self.origin[0] < self.width and 0 <= y - self.origin[1] < self.height):
+            if not solid:
+                return
+            self.grow_to(x, y)
+        self.data[(y - self.origin[1]) * self.width + x - self.origin[0]] = 1 if solid else 0
+
+    # Reallocate so that a grid position fits (with some margin so painting doesn't reallocate every tile)
+    def grow_to(self, x, y):
+        if self.width and self.height:
+            left, top = min(self.origin[0], x), min(self.origin[1], y)
+            right, bottom = max(self.origin[0] + self.width, x + 1), max(self.origin[1] + self.height, y + 1)
+        else:
+            left, top, right, bottom = x, y, x + 1, y + 1
+        left, top, right, bottom = left - GROW_MARGIN, top - GROW_MARGIN, right + GROW_MARGIN, bottom + GROW_MARGIN
+
+        old_cells, old_origin = self.cells, self.origin
+        self.allocate((left, top), right - left, bottom - top)
+        self.cells[old_origin[1] - top:old_origin[1] - top + old_cells.shape[0],
+                   old_origin[0] - left:old_origin[0] - left + old_cells.shape[1]] = old_cells
+
+
+# Cells covered by boxes, returns (box index, cell key) for every covered cell
+def box_cells(cell_size, x, y, w, h):
+    x0 = np.floor_divide(x, cell_size).astype(np.int64)
+    y0 = np.floor_divide(y, cell_size).astype(np.int64)
+    span_x = np.floor_divide(x + w, cell_size).astype(np.int64) - x0 + 1
+    span_y = np.floor_divide(y + h, cell_size).astype(np.int64) - y0 + 1
+    counts = span_x * span_y
+    owner = np.repeat(np.arange(len(x0)), counts)
+    step = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+    cell_x = x0[owner] + step % span_x[owner]
+    cell_y = y0[owner] + step // span_x[owner]
+    return owner, (cell_x << 32) + (cell_y & 0xffffffff)
+
+
+class SpatialHash:
+    """
+    Uniform grid for broad-phase checks, rebuilt from scratch whenever the things in it move.
+
+    Items are boxes (x, y, w, h) given as arrays, points are boxes without size. Instead of a dict of
+    lists, every (cell, item) pair goes in one array sorted by cell, so building is a sort and a query is
+    a binary search per cell, all in numpy.
+    """
+
+    def __init__(self, cell_size=BROADPHASE_CELL):
+        self.cell_size = cell_size
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.items = np.zeros(0, dtype=np.int64)
+
+    def build(self, x, y, w=0, h=0):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        owner, keys = box_cells(self.cell_size, x, y, np.broadcast_to(w, x.shape), np.broadcast_to(h, x.shape))
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.items = owner[order]
+
+    # Candidate pairs between query boxes and items sharing a cell with them
+    # Returns (query index, item index) arrays without duplicates, sorted by query then item
+    def pairs(self, x, y, w=0, h=0):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        owner, keys = box_cells(self.cell_size, x, y, np.broadcast_to(w, x.shape), np.broadcast_to(h, x.shape))
+        start = np.searchsorted(self.keys, keys, side='left')
+        counts = np.searchsorted(self.keys, keys, side='right') - start
+        query = np.repeat(owner, counts)
+        found = np.repeat(start, counts) + np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_keys = np.unique(query * max(1, len(self.items)) + self.items[found])
+        return pair_keys // max(1, len(self.items)), pair_keys % max(1, len(self.items))
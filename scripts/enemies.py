@@ -0,0 +1,354 @@
+import math
+import random
+
+import numpy as np
+
+from scripts.collision import SpatialHash
+from scripts.tilemap import CHUNK_SHIFT
+
+# Hit box size, the same for every enemy
+ENEMY_SIZE = (8, 15)
+
+# Animations every enemy has, the action column stores an index into this
+ENEMY_ACTIONS = ('idle', 'run')
+
+# What each kind of enemy looks like and does, indexed by archetype (spawner variant - 1)
+# offset is where the sprite is drawn relative to the hit box (includes the (-3, -3) entity padding)
+# contact_kill enemies kill the player on touch and can't be killed by dashing into them
+ENEMY_ARCHETYPES = [
+    {'type': 'enemy', 'projectile': 'projectile', 'color': (86, 68, 54), 'offset': (-58, -68),
+     'shoots': True, 'contact_kill': False},
+    {'type': 'goblin', 'projectile': 'bomb', 'color': (255, 255, 0), 'offset': (-38, -48),
+     'shoots': True, 'contact_kill': False},
+    {'type': 'mushroom', 'projectile': 'orb', 'color': (255, 0, 0), 'offset': (-38, -48),
+     'shoots': True, 'contact_kill': False},
+    {'type': 'skeleton', 'projectile': None, 'color': None, 'offset': (-28, -38),
+     'shoots': False, 'contact_kill': True},
+]
+
+# Per enemy state, one array per field with a row per enemy
+# collisions columns are up, down, right, left
+ENEMY_FIELDS = {
+    'pos': (np.float64, (2,)),
+    'prev_pos': (np.float64, (2,)),
+    'velocity': (np.float64, (2,)),
+    'walking': (np.int32, ()),
+    'flip': (np.bool_, ()),
+    'archetype': (np.int8, ()),
+    'action': (np.int8, ()),
+    'frame': (np.int32, ()),
+    'collisions': (np.bool_, (4,)),
+    'tier': (np.int8, ()),
+}
+
+# Level of detail tiers, from how far outside the view an enemy is
+# Near enemies get the full update and are drawn, the ones a bit further out still patrol, fall and shoot
+# but aren't animated or drawn, and the rest is frozen until the camera gets close again
+LOD_NEAR, LOD_SIMULATE, LOD_FROZEN = 0, 1, 2
+LOD_NEAR_MARGIN = 64
+LOD_SIMULATE_MARGIN = 400
+
+
+class EnemySystem:
+    """
+    All the enemies of a level, updated together.
+
+    Enemy state is kept as structure-of-arrays (one numpy array per field, see ENEMY_FIELDS) so
+    patrolling, gravity, tile collisions and player checks run over every enemy at once.
+    Only the rows [0, count) are live, the arrays grow by doubling.
+
+    Enemies far from the view are frozen and only the ones near it are animated and drawn (see LOD_NEAR).
+    """
+
+    def __init__(self, game):
+        self.game = game
+
+        # Archetype table as columns so they can be indexed with the archetype array
+        self.shoots = np.array([archetype['shoots'] for archetype in ENEMY_ARCHETYPES])
+        self.contact_kill = np.array([archetype['contact_kill'] for archetype in ENEMY_ARCHETYPES])
+        self.animations = [[game.assets[archetype['type'] + '/' + action] for action in ENEMY_ACTIONS]
+                           for archetype in ENEMY_ARCHETYPES]
+        self.anim_lengths = np.array([[anim.length for anim in actions] for actions in self.animations])
+
+        self.count = 0
+        self.allocate(16)
+
+        # Broad-phase over the near enemies, rebuilt every update
+        self.hash = SpatialHash()
+
+    def __len__(self):
+        return self.count
+
+    def allocate(self, capacity):
+        for name, (dtype, shape) in ENEMY_FIELDS.items():
+            column = np.zeros((capacity,) + shape, dtype=dtype)
+            if name in self.__dict__:
+                column[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, column)
+
+    def spawn(self, archetype, pos):
+        if self.count == len(self.walking):
+            self.allocate(self.count * 2)
+        i = self.count
+        for name, (dtype, shape) in ENEMY_FIELDS.items():
+            getattr(self, name)[i] = 0
+        self.pos[i] = pos
+        self.prev_pos[i] = pos
+        self.archetype[i] = archetype
+        self.count += 1
+
+    def clear(self):
+        self.count = 0
+
+    # Remove the enemies where mask is True, keeping the order of the rest
+    def remove(self, mask):
+        keep = ~mask
+        kept = int(keep.sum())
+        for name in ENEMY_FIELDS:
+            column = getattr(self, name)
+            column[:kept] = column[:self.count][keep]
+        self.count = kept
+
+    # Remove the enemies where mask is True and return their state so they can be put back with restore
+    def take(self, mask):
+        state = {name: getattr(self, name)[:self.count][mask] for name in ENEMY_FIELDS}
+        self.remove(mask)
+        return state
+
+    def restore(self, state):
+        added = len(state['archetype'])
+        if self.count + added > len(self.walking):
+            self.allocate(max(self.count * 2, self.count + added))
+        for name in ENEMY_FIELDS:
+            getattr(self, name)[self.count:self.count + added] = state[name]
+        self.count += added
+
+    # Mask of the enemies standing in a chunk
+    def in_chunk(self, tilemap, chunk_loc):
+        chunk_px = tilemap.tile_size << CHUNK_SHIFT
+        chunks = np.floor_divide(self.pos[:self.count], chunk_px)
+        return (chunks[:, 0] == chunk_loc[0]) & (chunks[:, 1] == chunk_loc[1])
+
+    # Level of detail of every enemy from its distance to the view (x, y, w, h)
+    def tiers(self, view):
+        n = self.count
+        if view is None:
+            return np.full(n, LOD_NEAR, dtype=np.int8)
+        x = self.pos[:n, 0]
+        y = self.pos[:n, 1]
+        distance = np.maximum(np.maximum(view[0] - x - ENEMY_SIZE[0], x - view[0] - view[2]),
+                              np.maximum(view[1] - y - ENEMY_SIZE[1], y - view[1] - view[3]))
+        return np.where(distance <= LOD_NEAR_MARGIN, LOD_NEAR,
+                        np.where(distance <= LOD_SIMULATE_MARGIN, LOD_SIMULATE, LOD_FROZEN)).astype(np.int8)
+
+    # Update the enemies around the view (x, y, w, h), or all of them if there's no view
+    def update(self, tilemap, view=None):
+        n = self.count
+        if not n:
+            return
+        self.tier[:n] = self.tiers(view)
+        # Frozen enemies are left exactly as they are, the rest is gathered, updated and written back
+        rows = np.flatnonzero(self.tier[:n] != LOD_FROZEN)
+        if not len(rows):
+            return
+        self.prev_pos[rows] = self.pos[rows]
+        pos = self.pos[rows]
+        walking = self.walking[rows]
+        flip = self.flip[rows]
+        archetype = self.archetype[rows]
+        collisions = self.collisions[rows]
+        player = self.game.player
+
+        # Enemy pathing logic, walk forward until there's a wall or no floor ahead and then turn around
+        was_walking = walking > 0
+        centerx = np.trunc(pos[:, 0]) + ENEMY_SIZE[0] // 2
+        floor_ahead = tilemap.solid_mask(centerx + np.where(flip, -7, 7), pos[:, 1] + 23)
+        blocked = collisions[:, 2] | collisions[:, 3]
+        step = was_walking & floor_ahead & ~blocked
+        movement = np.where(step, np.where(flip, -0.5, 0.5), 0.0)
+        flip ^= was_walking & ~step
+        walking[was_walking] -= 1
+        self.flip[rows] = flip
+
+        # Shoot at the player at the end of a walk when facing them
+        # (any height difference counts as in range, like it always has)
+        dis_x = player.pos[0] - pos[:, 0]
+        dis_y = player.pos[1] - pos[:, 1]
+        in_range = (dis_y != 0) | (np.abs(dis_x) < 1000)
+        fire = was_walking & (walking == 0) & self.shoots[archetype] & in_range & np.where(flip, dis_x < 0, dis_x > 0)
+        for i in rows[fire]:
+            self.shoot(i)
+
+        # Enemies standing around start a new walk now and then
+        start = ~was_walking & (np.random.random(len(rows)) < 0.01)
+        walking[start] = np.random.randint(30, 121, int(start.sum()))
+        self.walking[rows] = walking
+
+        self.move(tilemap, rows, movement)
+
+        # Update animation of the enemies that can be seen, the frame restarts when switching between idle and run
+        near = self.tier[rows] == LOD_NEAR
+        seen = rows[near]
+        action = (movement[near] != 0).astype(np.int8)
+        frame = self.frame[seen]
+        frame[action != self.action[seen]] = 0
+        self.action[seen] = action
+        self.frame[seen] = (frame + 1) % self.anim_lengths[archetype[near], action]
+
+        self.check_kills(rows)
+
+    # Move the enemies in rows by their velocity plus movement, one axis at a time, and push them out of solid
+    # tiles at their leading side (like PhysicsEntity used to do per enemy)
+    # Checking the tiles at the leading side after the move only works for steps shorter than a tile, enemies
+    # moving a whole tile or more in a step are swept through the grid one by one like the player instead
+    def move(self, tilemap, rows, movement):
+        pos = self.pos[rows]
+        velocity = self.velocity[rows]
+        collisions = np.zeros((len(rows), 4), dtype=bool)
+        ts = tilemap.tile_size
+        w, h = ENEMY_SIZE
+
+        # Horizontal
+        dx = movement + velocity[:, 0]
+        moved_x = pos[:, 0] + dx
+        new_col = np.where(dx > 0, np.ceil((moved_x + w) / ts) - 1, np.floor(moved_x / ts))
+        hit = self.cells_solid(tilemap, new_col, pos[:, 1], h) & (dx != 0)
+        pos[:, 0] = np.where(hit, np.where(dx > 0, new_col * ts - w, (new_col + 1) * ts), moved_x)
+        collisions[:, 2] = hit & (dx > 0)
+        collisions[:, 3] = hit & (dx < 0)
+
+        # Vertical
+        dy = velocity[:, 1]
+        moved_y = pos[:, 1] + dy
+        new_row = np.where(dy > 0, np.ceil((moved_y + h) / ts) - 1, np.floor(moved_y / ts))
+        hit = self.cells_solid(tilemap, new_row, pos[:, 0], w, rows=False) & (dy != 0)
+        pos[:, 1] = np.where(hit, np.where(dy > 0, new_row * ts - h, (new_row + 1) * ts), moved_y)
+        collisions[:, 0] = hit & (dy < 0)
+        collisions[:, 1] = hit & (dy > 0)
+
+        # Too fast for the leading side check, redo those with the swept move
+        fast = (np.abs(dx) >= ts) | (np.abs(dy) >= ts)
+        for i in np.flatnonzero(fast):
+            start = self.pos[rows[i]]
+            pos[i], normals = tilemap.move_rect((start[0], start[1], w, h), (dx[i], dy[i]))
+            collisions[i] = False
+            for normal in normals:
+                collisions[i, 0] |= normal[1] > 0
+                collisions[i, 1] |= normal[1] < 0
+                collisions[i, 2] |= normal[0] < 0
+                collisions[i, 3] |= normal[0] > 0
+
+        # Gravity
+        velocity[:, 1] = np.minimum(5, velocity[:, 1] + 0.1)
+        velocity[collisions[:, 0] | collisions[:, 1], 1] = 0
+
+        self.pos[rows] = pos
+        self.velocity[rows] = velocity
+        self.collisions[rows] = collisions
+
+    # Is any cell solid in a grid column (or row, when rows is False) between the pixels start and start + length
+    @staticmethod
+    def cells_solid(tilemap, line, start, length, rows=True):
+        ts = tilemap.tile_size
+        first = np.floor(start / ts)
+        last = np.ceil((start + length) / ts) - 1
+        result = np.zeros(len(line), dtype=bool)
+        for k in range(length // ts + 2):
+            cell = first + k
+            if rows:
+                solid = tilemap.solid_mask(line * ts, cell * ts)
+            else:
+                solid = tilemap.solid_mask(cell * ts, line * ts)
+            result |= solid & (cell <= last)
+        return result
+
+    # Enemies (out of rows) die when the player dashes into them or one of the player's projectiles hits them
+    # Both checks only look at candidates from the broad-phase instead of testing every pair
+    def check_kills(self, rows):
+        game = self.game
+        player_rect = game.player.rect()
+        x = np.trunc(self.pos[rows, 0])
+        y = np.trunc(self.pos[rows, 1])
+        w, h = ENEMY_SIZE
+
+        # Enemies touching the player, the player is always in view so only near enemies can
+        seen = np.flatnonzero(self.tier[rows] == LOD_NEAR)
+        self.hash.build(x[seen], y[seen], w, h)
+        near = seen[self.hash.pairs([player_rect.x], [player_rect.y], player_rect.w, player_rect.h)[1]]
+        touching = near[(x[near] < player_rect.right) & (x[near] + w > player_rect.x) &
+                        (y[near] < player_rect.bottom) & (y[near] + h > player_rect.y)]
+        contact_kill = self.contact_kill[self.archetype[rows[touching]]]
+
+        killed = np.zeros(len(rows), dtype=bool)
+        if abs(game.player.dashing) >= 50:
+            killed[touching[~contact_kill]] = True
+
+        # The player dies in this case
+        for i in rows[touching[contact_kill]]:
+            game.dead += 1
+            game.sfx['hit'].play()
+            game.screenshake = max(16, game.screenshake)
+            self.burst(self.center(i), 10)
+
+        # Each enemy is killed by the first projectile in it that didn't kill another enemy already
+        projectiles = game.player_projectiles
+        used = set()
+        for i, slot in zip(*(pairs.tolist() for pairs in projectiles.hits(x, y, w, h))):
+            if not killed[i] and slot not in used:
+                killed[i] = True
+                used.add(slot)
+                projectiles.kill(slot)
+
+        for i in rows[killed]:
+            game.sfx['hit'].play()
+            # Add screenshake when the enemy died
+            game.screenshake = max(16, game.screenshake)
+            self.burst(self.center(i), 30)
+        if killed.any():
+            dead = np.zeros(self.count, dtype=bool)
+            dead[rows[killed]] = True
+            self.remove(dead)
+
+    def center(self, i):
+        return (int(self.pos[i, 0]) + ENEMY_SIZE[0] // 2, int(self.pos[i, 1]) + ENEMY_SIZE[1] // 2)
+
+    def shoot(self, i):
+        archetype = ENEMY_ARCHETYPES[self.archetype[i]]
+        direction = -1 if self.flip[i] else 1
+        centerx, centery = self.center(i)
+        pos = (centerx + 7 * direction, centery)
+        self.game.projectiles.add(pos, 1.5 * direction, self.game.assets[archetype['projectile']],
+                                  archetype['color'])
+        # Add Sparks when gun is shot
+        for k in range(12):
+            self.game.sparks.add(pos, random.random() - 0.5 + (math.pi if direction < 0 else 0),
+                                 2 + random.random(), archetype['color'])
+
+    # Visual effects when something dies
+    def burst(self, center, count):
+        for k in range(count):
+            angle = random.random() * math.pi * 2
+            speed = random.random() * 5
+            self.game.sparks.add(center, angle, 2 + random.random(), (255, 0, 0))
+            self.game.particles.add('particle', center,
+                                    velocity=(math.cos(angle + math.pi) * speed * 0.5,
+                                              math.sin(angle + math.pi) * speed * 0.5),
+                                    frame=random.randint(0, 7))
+        self.game.sparks.add(center, 0, 5 + random.random(), (255, 0, 0))
+        self.game.sparks.add(center, math.pi, 5 + random.random(), (255, 0, 0))
+
+    # Draw the near enemies, alpha is how far between their previous and current positions
+    def render(self, surf, offset=(0, 0), alpha=1, outline=None):
+        seen = np.flatnonzero(self.tier[:self.count] == LOD_NEAR)
+        pos = self.prev_pos[seen] + (self.pos[seen] - self.prev_pos[seen]) * alpha
+        blits = []
+        for archetype, action, frame, flip, (x, y) in zip(self.archetype[seen].tolist(), self.action[seen].tolist(),
+                                                          self.frame[seen].tolist(), self.flip[seen].tolist(),
+                                                          pos.tolist()):
+            anim = self.animations[archetype][action]
+            img = (anim.frame_images_flipped if flip else anim.frame_images)[frame]
+            sprite_offset = ENEMY_ARCHETYPES[archetype]['offset']
+            blits.append((img, (x - offset[0] + sprite_offset[0], y - offset[1] + sprite_offset[1])))
+        surf.blits(blits, doreturn=False)
+        if outline:
+            outline.add(blits)
@@ -0,0 +1,274 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+import numpy as np
+
+# Binary level layout (little endian):
+#   header       magic 'KMAP', u16 version, u16 tile size, u32 crc32 of the JSON file it was converted from
+#   type names   u16 count, then (u8 length, utf-8 name) per type, type id 0 means empty
+#   grid         i32 origin x, i32 origin y, u32 width, u32 height,
+#                u8[width * height] type ids, u8[width * height] variants (row major)
+#   offgrid      u32 count, u8[count] type ids, u8[count] variants, f64[count * 2] positions
+MAGIC = b'KMAP'
+VERSION = 2
+HEADER = struct.Struct('<4sHHI')
+GRID_HEADER = struct.Struct('<iiII')
+COUNT = struct.Struct('<H')
+OFFGRID_COUNT = struct.Struct('<I')
+
+BINARY_EXT = '.kmap'
+JSON_EXT = '.json'
+
+# Parsed levels, path -> (modified time, LevelData, mmap or None), so respawning doesn't touch the disk again
+_level_cache = {}
+
+
+class LevelData:
+    """
+    A level held as packed arrays: grid tile types/variants over a bounding box, plus an off-grid table.
+
+    Arrays are treated as read-only, a Tilemap builds its own tile dicts from them.
+    """
+
+    def __init__(self, tile_size, type_names, origin, types, variants, offgrid_types, offgrid_variants,
+                 offgrid_pos, source_hash=0):
+        self.tile_size = tile_size
+        self.type_names = type_names
+        self.origin = origin
+        self.types = types
+        self.variants = variants
+        self.offgrid_types = offgrid_types
+        self.offgrid_variants = offgrid_variants
+        self.offgrid_pos = offgrid_pos
+        # crc32 of the JSON file this level was read from or converted from (0 if there's none)
+        self.source_hash = source_hash
+
+    @classmethod
+    def from_tiles(cls, tile_size, tiles, offgrid_tiles):
+        type_names = sorted({tile['type'] for tile in tiles} | {tile['type'] for tile in offgrid_tiles})
+        type_ids = {name: i + 1 for i, name in enumerate(type_names)}
+
+        if tiles:
+            xs = [tile['pos'][0] for tile in tiles]
+            ys = [tile['pos'][1] for tile in tiles]
+            origin = (min(xs), min(ys))
+            width, height = max(xs) - origin[0] + 1, max(ys) - origin[1] + 1
+        else:
+            origin, width, height = (0, 0), 0, 0
+        types = np.zeros((height, width), dtype=np.uint8)
+        variants = np.zeros((height, width), dtype=np.uint8)
+        for tile in tiles:
+            types[tile['pos'][1] - origin[1], tile['pos'][0] - origin[0]] = type_ids[tile['type']]
+            variants[tile['pos'][1] - origin[1], tile['pos'][0] - origin[0]] = tile['variant']
+
+        offgrid_types = np.array([type_ids[tile['type']] for tile in offgrid_tiles], dtype=np.uint8)
+        offgrid_variants = np.array([tile['variant'] for tile in offgrid_tiles], dtype=np.uint8)
+        offgrid_pos = np.array([tile['pos'] for tile in offgrid_tiles], dtype=np.float64).reshape(-1, 2)
+
+        return cls(tile_size, type_names, origin, types, variants, offgrid_types, offgrid_variants, offgrid_pos)
+
+    @classmethod
+    def from_json(cls, map_data):
+        return cls.from_tiles(map_data['tile_size'], list(map_data['tilemap'].values()), map_data['offgrid'])
+
+    # Tile size, source hash, type names and where the grid header starts in binary level data
+    @staticmethod
+    def read_header(data):
+        magic, version, tile_size, source_hash = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Not a level file (or an unsupported version)')
+        offset = HEADER.size
+
+        type_names = []
+        (type_count,) = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        for i in range(type_count):
+            length = data[offset]
+            type_names.append(bytes(data[offset + 1:offset + 1 + length]).decode('utf-8'))
+            offset += 1 + length
+        return tile_size, source_hash, type_names, offset
+
+    # Number of grid cells in binary level data, without building any arrays
+    @classmethod
+    def grid_cells(cls, data):
+        origin_x, origin_y, width, height = GRID_HEADER.unpack_from(data, cls.read_header(data)[3])
+        return width * height
+
+    @classmethod
+    def from_bytes(cls, data):
+        tile_size, source_hash, type_names, offset = cls.read_header(data)
+        origin_x, origin_y, width, height = GRID_HEADER.unpack_from(data, offset)
+        offset += GRID_HEADER.size
+        size = width * height
+        types = np.frombuffer(data, dtype=np.uint8, count=size, offset=offset).reshape(height, width)
+        variants = np.frombuffer(data, dtype=np.uint8, count=size, offset=offset + size).reshape(height, width)
+        offset += size * 2
+
+        (count,) = OFFGRID_COUNT.unpack_from(data, offset)
+        offset += OFFGRID_COUNT.size
+        offgrid_types = np.frombuffer(data, dtype=np.uint8, count=count, offset=offset)
+        offgrid_variants = np.frombuffer(data, dtype=np.uint8, count=count, offset=offset + count)
+        offgrid_pos = np.frombuffer(data, dtype='<f8', count=count * 2, offset=offset + count * 2).reshape(count, 2)
+
+        return cls(tile_size, type_names, (origin_x, origin_y), types, variants, offgrid_types, offgrid_variants,
+                   offgrid_pos, source_hash)
+
+    def to_bytes(self):
+        parts = [HEADER.pack(MAGIC, VERSION, self.tile_size, self.source_hash), COUNT.pack(len(self.type_names))]
+        for name in self.type_names:
+            encoded = name.encode('utf-8')
+            parts.append(bytes([len(encoded)]) + encoded)
+        height, width = self.types.shape
+        parts.append(GRID_HEADER.pack(self.origin[0], self.origin[1], width, height))
+        parts.append(np.ascontiguousarray(self.types, dtype=np.uint8).tobytes())
+        parts.append(np.ascontiguousarray(self.variants, dtype=np.uint8).tobytes())
+        parts.append(OFFGRID_COUNT.pack(len(self.offgrid_types)))
+        parts.append(np.ascontiguousarray(self.offgrid_types, dtype=np.uint8).tobytes())
+        parts.append(np.ascontiguousarray(self.offgrid_variants, dtype=np.uint8).tobytes())
+        parts.append(np.ascontiguousarray(self.offgrid_pos, dtype='<f8').tobytes())
+        return b''.join(parts)
+
+    # Id of a type name in the packed arrays (0 if the level doesn't use it)
+    def type_id(self, name):
+        return self.type_names.index(name) + 1 if name in self.type_names else 0
+
+    # Fresh on-grid tile dicts, same shape as the ones in JSON maps
+    # rect (x, y, w, h) in grid coordinates limits it to part of the map
+    def tiles(self, rect=None):
+        left, top = self.origin
+        types, variants = self.types, self.variants
+        if rect is not None:
+            x0, y0 = max(rect[0] - left, 0), max(rect[1] - top, 0)
+            x1, y1 = max(rect[0] + rect[2] - left, x0), max(rect[1] + rect[3] - top, y0)
+            types, variants = types[y0:y1, x0:x1], variants[y0:y1, x0:x1]
+            left, top = left + x0, top + y0
+
+        ys, xs = np.nonzero(types)
+        names = self.type_names
+        return [{'type': names[type_id - 1], 'variant': variant, 'pos': [x, y]}
+                for x, y, type_id, variant in zip((xs + left).tolist(), (ys + top).tolist(),
+                                                  types[ys, xs].tolist(), variants[ys, xs].tolist())]
+
+    # Fresh off-grid tile dicts, rows limits it to some entries of the off-grid table
+    def offgrid(self, rows=None):
+        types, variants, positions = self.offgrid_types, self.offgrid_variants, self.offgrid_pos
+        if rows is not None:
+            types, variants, positions = types[rows], variants[rows], positions[rows]
+        names = self.type_names
+        return [{'type': names[type_id - 1], 'variant': variant, 'pos': pos}
+                for type_id, variant, pos in zip(types.tolist(), variants.tolist(), positions.tolist())]
+
+    def to_json(self):
+        return {'tilemap': {str(tile['pos'][0]) + ';' + str(tile['pos'][1]): tile for tile in self.tiles()},
+                'tile_size': self.tile_size, 'offgrid': self.offgrid()}
+
+
+# Read a level in either format, parsed levels are cached until the file changes
+# Binary files with at least map_min_cells grid cells are memory-mapped instead of read, so only the parts
+# in use get paged in, smaller ones aren't worth keeping a mapping open for
+def read_level(path, map_min_cells=None):
+    mtime = os.path.getmtime(path)
+    cached = _level_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    mapping = None
+    if path.endswith(BINARY_EXT):
+        f = open(path, 'rb')
+        if map_min_cells is not None:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if LevelData.grid_cells(mapping) < map_min_cells:
+                mapping.close()
+                mapping = None
+        if mapping is not None:
+            data = LevelData.from_bytes(mapping)
+        else:
+            data = LevelData.from_bytes(f.read())
+        f.close()
+    else:
+        f = open(path, 'rb')
+        text = f.read()
+        f.close()
+        data = LevelData.from_json(json.loads(text))
+        data.source_hash = zlib.crc32(text)
+
+    forget_level(path)
+    _level_cache[path] = (mtime, data, mapping)
+    return data
+
+
+# Drop a cached level and close its mapping
+# A level that is still being streamed from keeps its mapping alive until it is dropped
+def forget_level(path):
+    cached = _level_cache.pop(path, None)
+    if cached is not None and cached[2] is not None:
+        try:
+            cached[2].close()
+        except BufferError:
+            pass
+
+
+# The file is written next to the old one and swapped in, so a mapping of the old file stays valid
+# (truncating a mapped file in place crashes whoever reads it next)
+def write_level(path, data):
+    forget_level(path)
+    temp_path = path + '.tmp'
+    if path.endswith(BINARY_EXT):
+        f = open(temp_path, 'wb')
+        f.write(data.to_bytes())
+        f.close()
+    else:
+        text = json.dumps(data.to_json()).encode('utf-8')
+        data.source_hash = zlib.crc32(text)
+        f = open(temp_path, 'wb')
+        f.write(text)
+        f.close()
+    os.replace(temp_path, path)
+
+
+# Path of a level, prefers the binary file unless the JSON one has changed since it was converted
+# File times say nothing after a checkout or unpacking an archive, so this compares contents through the
+# hash of the JSON recorded in the binary file
+def level_path(map_dir, map_id):
+    json_path = os.path.join(map_dir, str(map_id) + JSON_EXT)
+    binary_path = os.path.join(map_dir, str(map_id) + BINARY_EXT)
+    if os.path.exists(binary_path):
+        if not os.path.exists(json_path):
+            return binary_path
+        f = open(json_path, 'rb')
+        json_hash = zlib.crc32(f.read())
+        f.close()
+        if source_hash(binary_path) == json_hash:
+            return binary_path
+    return json_path
+
+
+# Hash of the JSON file a binary level was converted from (None if the file is from an older version)
+def source_hash(binary_path):
+    f = open(binary_path, 'rb')
+    header = f.read(HEADER.size)
+    f.close()
+    if len(header) < HEADER.size:
+        return None
+    magic, version, tile_size, json_hash = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        return None
+    return json_hash
+
+
+# Number of levels in a map folder (levels are numbered 0..n-1)
+def level_count(map_dir):
+    return len({os.path.splitext(name)[0] for name in os.listdir(map_dir)
+                if name.endswith(JSON_EXT) or name.endswith(BINARY_EXT)})
+
+
+# Convert JSON maps to the binary format, e.g. python -m scripts.levelfile data/maps/*.json
+if __name__ == '__main__':
+    for json_path in sys.argv[1:]:
+        binary_path = os.path.splitext(json_path)[0] + BINARY_EXT
+        write_level(binary_path, read_level(json_path))
+        print(json_path, '->', binary_path, '(' + str(os.path.getsize(binary_path)) + ' bytes)')
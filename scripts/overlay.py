@@ -0,0 +1,48 @@
+import pygame
+
+
+class OverlayCache:
+    """
+    Full-screen effect surfaces, each built the first time it's asked for and reused after that.
+
+    Surfaces are keyed by what they show, so an effect that goes through the same frames (like the
+    level transition) stops allocating once it has been played once. New effects can use get() with
+    their own key and a function that draws the surface.
+    """
+
+    def __init__(self, size):
+        self.size = tuple(size)
+        self.surfaces = {}
+
+    # Surface for key, made by build(size) if it isn't cached yet
+    def get(self, key, build, size=None):
+        size = tuple(size or self.size)
+        surf = self.surfaces.get((key, size))
+        if surf is None:
+            surf = build(size)
+            self.surfaces[(key, size)] = surf
+        return surf
+
+    # Black screen with a see-through circle in the middle (level transitions)
+    def iris(self, radius, size=None):
+        return self.get(('iris', radius), lambda size: self.build_iris(size, radius), size)
+
+    @staticmethod
+    def build_iris(size, radius):
+        surf = pygame.Surface(size)
+        pygame.draw.circle(surf, (255, 255, 255), (size[0] // 2, size[1] // 2), radius)
+        surf.set_colorkey((255, 255, 255), pygame.RLEACCEL)
+        return surf
+
+    # Surface filled with a (possibly transparent) color
+    def fill(self, color, size=None):
+        return self.get(('fill', tuple(color)), lambda size: self.build_fill(size, color), size)
+
+    @staticmethod
+    def build_fill(size, color):
+        surf = pygame.Surface(size, pygame.SRCALPHA)
+        surf.fill(color)
+        return surf
+
+    def clear(self):
+        self.surfaces.clear()
@@ -0,0 +1,68 @@
+import pygame
+
+
+class ParallaxLayer:
+    def __init__(self, img, pos=(0, 0), depth=0, speed=0, tile=False):
+        self.img = img
+        self.pos = list(pos)
+        # How much the layer moves with the camera (0 stays on screen, 1 moves with the level)
+        self.depth = depth
+        # Horizontal drift per update
+        self.speed = speed
+        # Tiled layers repeat horizontally to cover the whole surface, the others wrap around it
+        self.tile = tile
+
+    def update(self):
+        self.pos[0] += self.speed
+
+    def render(self, surf, offset=(0, 0)):
+        render_pos = (self.pos[0] - offset[0] * self.depth, self.pos[1] - offset[1] * self.depth)
+        if self.tile:
+            width = self.img.get_width()
+            x = render_pos[0] % width
+            if x > 0:
+                x -= width
+            while x < surf.get_width():
+                surf.blit(self.img, (x, render_pos[1]))
+                x += width
+        else:
+            surf.blit(self.img, (render_pos[0] % surf.get_width(), render_pos[1] % surf.get_height()))
+
+
+class Parallax:
+    """
+    Layers drawn back to front, each scrolled by its own depth.
+
+    Neighbouring layers that always move together (same depth, drift, position and size) are merged into
+    one pre-composited surface when they're added, so drawing them costs a single blit.
+    """
+
+    def __init__(self, layers=()):
+        self.layers = []
+        for layer in layers:
+            self.add(layer)
+
+    def add(self, layer):
+        last = self.layers[-1] if self.layers else None
+        if last and not layer.speed and not last.speed and (layer.depth, layer.tile, layer.pos) == \
+                (last.depth, last.tile, last.pos) and layer.img.get_size() == last.img.get_size():
+            last.img = self.composite(last.img, layer.img)
+        else:
+            self.layers.append(layer)
+
+    @staticmethod
+    def composite(bottom, top):
+        surf = pygame.Surface(bottom.get_size())
+        surf.fill((0, 0, 0))
+        surf.set_colorkey((0, 0, 0))
+        surf.blit(bottom, (0, 0))
+        surf.blit(top, (0, 0))
+        return surf
+
+    def update(self):
+        for layer in self.layers:
+            layer.update()
+
+    def render(self, surf, offset=(0, 0)):
+        for layer in self.layers:
+            layer.render(surf, offset=offset)
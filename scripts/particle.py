@@ -1,24 +1,88 @@
-class Particle:
-    def __init__(self, game, p_type, pos, velocity=[0, 0], frame=0):
-        self.game = game
-        self.type = p_type
-        self.pos = list(pos)
-        self.velocity = list(velocity)
-        self.animation = self.game.assets['particle/' + p_type].copy()
-        self.animation.frame = frame
+import numpy as np
 
-    def update(self):
-        kill = False
-        if self.animation.done:
-            kill = True
+# Particle types, the kind column stores an index into this (animations are the 'particle/<type>' assets)
+PARTICLE_TYPES = ('leaf', 'particle')
+
+
+class ParticleSystem:
+    """
+    Every particle of the level, stored as numpy arrays (position, velocity, animation frame, type).
+
+    Particles play their animation once and are removed after the last frame. The arrays are
+    preallocated and only grow (doubling) if there are ever more particles than fit.
+    """
+
+    def __init__(self, game, capacity=1024):
+        self.clips = [game.assets['particle/' + p_type] for p_type in PARTICLE_TYPES]
+        self.lengths = np.array([clip.length for clip in self.clips])
+        # Top left corner of every animation tick relative to the particle position, images are centered on it
+        self.corners = [[(-(img.get_width() // 2), -(img.get_height() // 2)) for img in clip.frame_images]
+                        for clip in self.clips]
+        self.leaf = PARTICLE_TYPES.index('leaf')
+
+        self.count = 0
+        self.pos = np.zeros((capacity, 2))
+        self.velocity = np.zeros((capacity, 2))
+        self.frame = np.zeros(capacity, dtype=np.int32)
+        self.kind = np.zeros(capacity, dtype=np.int8)
+        self.done = np.zeros(capacity, dtype=bool)
+        # Finished particles are still drawn on the frame after their last update and removed on the next one
+        self.dying = np.zeros(capacity, dtype=bool)
 
-        self.pos[0] += self.velocity[0]
-        self.pos[1] += self.velocity[1]
+    def __len__(self):
+        return self.count
+
+    def add(self, p_type, pos, velocity=(0, 0), frame=0):
+        if self.count == len(self.frame):
+            self.grow()
+        i = self.count
+        self.pos[i] = pos
+        self.velocity[i] = velocity
+        self.frame[i] = frame
+        self.kind[i] = PARTICLE_TYPES.index(p_type)
+        self.done[i] = False
+        self.dying[i] = False
+        self.count += 1
+
+    def grow(self):
+        for name in ('pos', 'velocity', 'frame', 'kind', 'done', 'dying'):
+            column = getattr(self, name)
+            setattr(self, name, np.concatenate([column, np.zeros_like(column)]))
+
+    def clear(self):
+        self.count = 0
+
+    def update(self):
+        # Retire the particles that finished last update, keeping the order of the rest
+        if self.dying[:self.count].any():
+            keep = np.flatnonzero(~self.dying[:self.count])
+            for column in (self.pos, self.velocity, self.frame, self.kind, self.done):
+                column[:len(keep)] = column[keep]
+            self.count = len(keep)
+        n = self.count
+        if not n:
+            return
+        pos = self.pos[:n]
+        frame = self.frame[:n]
+        kind = self.kind[:n]
 
-        self.animation.update()
+        # Leaves sway from side to side as they fall
+        leaves = kind == self.leaf
+        pos[leaves, 0] += np.sin(frame[leaves] * 0.035) * 0.3
 
-        return kill
+        self.dying[:n] = self.done[:n]
+        pos += self.velocity[:n]
+        last = self.lengths[kind] - 1
+        np.minimum(frame + 1, last, out=frame)
+        self.done[:n] |= frame >= last
 
     def render(self, surf, offset=(0, 0)):
-        img = self.animation.img()
-        surf.blit(img, (self.pos[0] - offset[0] - img.get_width() // 2, self.pos[1] - offset[1] - img.get_height() // 2))
+        n = self.count
+        clips = self.clips
+        corners = self.corners
+        blits = []
+        for kind, frame, x, y in zip(self.kind[:n].tolist(), self.frame[:n].tolist(),
+                                     self.pos[:n, 0].tolist(), self.pos[:n, 1].tolist()):
+            corner = corners[kind][frame]
+            blits.append((clips[kind].frame_images[frame], (x - offset[0] + corner[0], y - offset[1] + corner[1])))
+        surf.blits(blits, doreturn=False)
@@ -0,0 +1,149 @@
+import sys
+import time
+
+import pygame
+
+# How the low resolution frame gets onto the screen
+#   'stretch' fills the whole screen like before (pixels may not be square)
+#   'integer' scales by the biggest whole factor that fits, centered with black borders
+#   'fit' scales as big as fits while keeping the aspect ratio, centered with black borders
+#   'scaled' lets SDL scale with pygame's SCALED display mode (usually on the GPU)
+PRESENT_MODES = ('stretch', 'integer', 'fit', 'scaled')
+
+
+class Presenter:
+    """
+    Owns the window and puts the finished frame on it.
+
+    The scaled frame goes straight into the part of the screen it covers, so nothing is allocated per
+    frame. Only a shaken frame goes through a preallocated surface first, since it has to be moved.
+    """
+
+    def __init__(self, size, mode='stretch', flags=pygame.FULLSCREEN, window_size=(0, 0)):
+        self.size = tuple(size)
+        self.mode = mode
+        if mode == 'scaled':
+            self.screen = pygame.display.set_mode(self.size, flags | pygame.SCALED)
+        else:
+            self.screen = pygame.display.set_mode(window_size, flags)
+        self.layout()
+
+    # Work out where the frame goes on the screen and preallocate what's needed to draw it there
+    def layout(self):
+        screen_w, screen_h = self.screen.get_size()
+        w, h = self.size
+        if self.mode == 'scaled':
+            # SDL letterboxes on its own, the screen surface is the frame size
+            desktop_w, desktop_h = pygame.display.get_desktop_sizes()[0]
+            self.scale = min(desktop_w / w, desktop_h / h)
+            self.rect = self.screen.get_rect()
+        else:
+            if self.mode == 'integer':
+                factor = max(1, min(screen_w // w, screen_h // h))
+                frame_size = (w * factor, h * factor)
+            elif self.mode == 'fit':
+                factor = min(screen_w / w, screen_h / h)
+                frame_size = (int(w * factor), int(h * factor))
+            else:
+                factor = screen_w / w
+                frame_size = (screen_w, screen_h)
+            self.scale = factor
+            self.rect = pygame.Rect(((screen_w - frame_size[0]) // 2, (screen_h - frame_size[1]) // 2), frame_size)
+            self.view = self.screen.subsurface(self.rect)
+            self.frame = pygame.Surface(frame_size).convert(self.screen)
+
+        # Screen areas around the frame, cleared once here and again whenever shaking drew over them
+        self.borders = [rect for rect in (
+            pygame.Rect(0, 0, screen_w, self.rect.top),
+            pygame.Rect(0, self.rect.bottom, screen_w, screen_h - self.rect.bottom),
+            pygame.Rect(0, self.rect.top, self.rect.left, self.rect.height),
+            pygame.Rect(self.rect.right, self.rect.top, screen_w - self.rect.right, self.rect.height),
+        ) if rect.w > 0 and rect.h > 0]
+        self.screen.fill((0, 0, 0))
+        self.shaken = False
+
+    # Draw surf (the frame size) on the screen, offset is the screenshake in screen pixels
+    def present(self, surf, offset=(0, 0)):
+        offset = (int(offset[0]), int(offset[1]))
+        if self.mode == 'scaled':
+            offset = (round(offset[0] / self.scale), round(offset[1] / self.scale))
+            if offset != (0, 0) or self.shaken:
+                self.screen.fill((0, 0, 0))
+            self.screen.blit(surf, offset)
+        elif offset[0] or offset[1]:
+            self.scale_into(surf, self.frame)
+            if self.shaken:
+                for rect in self.borders:
+                    self.screen.fill((0, 0, 0), rect)
+            self.screen.blit(self.frame, (self.rect.x + offset[0], self.rect.y + offset[1]))
+        else:
+            if self.shaken:
+                for rect in self.borders:
+                    self.screen.fill((0, 0, 0), rect)
+            self.scale_into(surf, self.view)
+        self.shaken = bool(offset[0] or offset[1])
+        pygame.display.update()
+
+    # Only put the given areas of surf (in frame pixels) on the screen and update just those
+    # Exact when the screen is a whole multiple of the frame size
+    def present_rects(self, surf, rects):
+        w, h = self.size
+        updated = []
+        for rect in rects:
+            if self.mode == 'scaled':
+                self.screen.blit(surf, rect, rect)
+                updated.append(rect)
+                continue
+            left = rect.left * self.rect.w // w
+            top = rect.top * self.rect.h // h
+            right = rect.right * self.rect.w // w
+            bottom = rect.bottom * self.rect.h // h
+            screen_rect = pygame.Rect(left, top, right - left, bottom - top)
+            if screen_rect.w and screen_rect.h:
+                self.scale_into(surf.subsurface(rect), self.view.subsurface(screen_rect))
+                updated.append(screen_rect.move(self.rect.topleft))
+        pygame.display.update(updated)
+
+    @staticmethod
+    def scale_into(surf, dest):
+        try:
+            pygame.transform.scale(surf, dest.get_size(), dest)
+        except ValueError:
+            # Scaling in place needs the same pixel format as the screen, otherwise take the slow path
+            dest.blit(pygame.transform.scale(surf, dest.get_size()), (0, 0))
+
+
+# Time every mode at a screen size: python -m scripts.present [WIDTHxHEIGHT] [frames]
+def benchmark(screen_size=(2560, 1440), frames=300, size=(320, 240)):
+    pygame.init()
+    src = pygame.Surface(size)
+    for mode in PRESENT_MODES:
+        try:
+            presenter = Presenter(size, mode, flags=0, window_size=screen_size)
+        except pygame.error as e:
+            print(f'{mode:>8}: not available ({e})')
+            continue
+        src = src.convert(presenter.screen)
+        times = []
+        for offset in ((0, 0), (3, -2)):
+            start = time.perf_counter()
+            for i in range(frames):
+                presenter.present(src, offset)
+            times.append((time.perf_counter() - start) * 1000 / frames)
+        print(f'{mode:>8}: {times[0]:.3f} ms/frame, shaking {times[1]:.3f} ms/frame '
+              f'({presenter.rect.w}x{presenter.rect.h} on {screen_size[0]}x{screen_size[1]})')
+
+    # What presenting cost before, scaling into a new screen-sized surface every frame
+    screen = pygame.display.set_mode(screen_size)
+    src = src.convert(screen)
+    start = time.perf_counter()
+    for i in range(frames):
+        screen.blit(pygame.transform.scale(src, screen.get_size()), (0, 0))
+        pygame.display.update()
+    print(f'{"old":>8}: {(time.perf_counter() - start) * 1000 / frames:.3f} ms/frame')
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    screen_size = tuple(int(n) for n in sys.argv[1].split('x')) if len(sys.argv) > 1 else (2560, 1440)
+    benchmark(screen_size, int(sys.argv[2]) if len(sys.argv) > 2 else 300)
@@ -0,0 +1,137 @@
+import numpy as np
+
+from scripts.collision import SpatialHash
+
+# Frames a projectile flies before it disappears
+PROJECTILE_LIFETIME = 360
+
+
+class ProjectilePool:
+    """
+    Projectiles stored in fixed-capacity arrays with a free list of slots.
+
+    A projectile is a slot index. Adding takes a free slot and killing gives it back, so nothing is
+    allocated or shifted while playing. Moving, aging and wall hits are done for all slots at once.
+    The pool only grows (doubling) if it ever runs out of slots.
+
+    Hit checks go through a SpatialHash of the projectiles, rebuilt on the first check after they moved.
+    """
+
+    def __init__(self, capacity=256):
+        self.capacity = 0
+        self.count = 0
+        self.free = []
+        self.allocate(capacity)
+
+        self.hash = SpatialHash()
+        # Slots in the hash, in the order they were added to it
+        self.hashed = np.zeros(0, dtype=np.int64)
+        self.hash_valid = False
+
+    def __len__(self):
+        return self.count
+
+    def allocate(self, capacity):
+        old = self.capacity
+        pos = np.zeros((capacity, 2))
+        prev_x = np.zeros(capacity)
+        speed = np.zeros(capacity)
+        timer = np.zeros(capacity, dtype=np.int32)
+        alive = np.zeros(capacity, dtype=bool)
+        if old:
+            pos[:old] = self.pos
+            prev_x[:old] = self.prev_x
+            speed[:old] = self.speed
+            timer[:old] = self.timer
+            alive[:old] = self.alive
+            self.imgs += [None] * (capacity - old)
+            self.colors += [None] * (capacity - old)
+        else:
+            self.imgs = [None] * capacity
+            self.colors = [None] * capacity
+        self.pos, self.prev_x, self.speed, self.timer, self.alive = pos, prev_x, speed, timer, alive
+        # Lowest slots are handed out first
+        self.free = list(range(capacity - 1, old - 1, -1)) + self.free
+        self.capacity = capacity
+
+    # Fire a projectile from pos moving speed pixels per frame horizontally, returns its slot
+    def add(self, pos, speed, img, color):
+        if not self.free:
+            self.allocate(self.capacity * 2)
+        slot = self.free.pop()
+        self.pos[slot] = pos
+        self.prev_x[slot] = pos[0]
+        self.speed[slot] = speed
+        self.timer[slot] = 0
+        self.alive[slot] = True
+        self.imgs[slot] = img
+        self.colors[slot] = color
+        self.count += 1
+        self.hash_valid = False
+        return slot
+
+    def kill(self, slots):
+        for slot in np.atleast_1d(slots).tolist():
+            if self.alive[slot]:
+                self.alive[slot] = False
+                self.imgs[slot] = None
+                self.free.append(slot)
+                self.count -= 1
+
+    def clear(self):
+        self.kill(self.live())
+
+    # Slots in use
+    def live(self):
+        return np.flatnonzero(self.alive)
+
+    # Move and age every projectile, removing the ones that expired or hit a wall
+    # Returns (pos, speed, color) of the wall hits so the caller can add effects
+    def update(self, tilemap):
+        live = self.live()
+        if not len(live):
+            return []
+        self.prev_x[live] = self.pos[live, 0]
+        self.pos[live, 0] += self.speed[live]
+        self.timer[live] += 1
+        self.hash_valid = False
+
+        pos = self.pos[live]
+        wall = tilemap.solid_mask(pos[:, 0], pos[:, 1])
+        expired = self.timer[live] > PROJECTILE_LIFETIME
+        hits = [(tuple(self.pos[slot]), self.speed[slot], self.colors[slot]) for slot in live[wall].tolist()]
+        self.kill(live[wall | expired])
+        return hits
+
+    # Projectiles inside boxes given as arrays (same rule as Rect.collidepoint)
+    # Returns (box index, slot) pairs sorted by box then slot
+    def hits(self, x, y, w, h):
+        if not self.hash_valid:
+            self.hashed = self.live()
+            pos = np.trunc(self.pos[self.hashed])
+            self.hash.build(pos[:, 0], pos[:, 1])
+            self.hash_valid = True
+        x = np.asarray(x)
+        y = np.asarray(y)
+        boxes, items = self.hash.pairs(x, y, w, h)
+        slots = self.hashed[items]
+        px = np.trunc(self.pos[slots, 0])
+        py = np.trunc(self.pos[slots, 1])
+        inside = self.alive[slots] & (px >= x[boxes]) & (px < x[boxes] + w) & (py >= y[boxes]) & (py < y[boxes] + h)
+        return boxes[inside], slots[inside]
+
+    # Slots of the projectiles inside a rect
+    def inside(self, rect):
+        return self.hits([rect.x], [rect.y], rect.w, rect.h)[1]
+
+    # alpha is how far between the previous and current positions to draw them
+    def render(self, surf, offset=(0, 0), alpha=1, outline=None):
+        live = self.live()
+        xs = self.prev_x[live] + (self.pos[live, 0] - self.prev_x[live]) * alpha
+        blits = []
+        for slot, x, y in zip(live.tolist(), xs.tolist(), self.pos[live, 1].tolist()):
+            img = self.imgs[slot]
+            blits.append((img, (x - img.get_width() / 2 - offset[0], y - img.get_height() / 2 - offset[1])))
+        surf.blits(blits, doreturn=False)
+        if outline:
+            outline.add(blits)
@@ -1,34 +1,76 @@
-import math
+import numpy as np
 import pygame
 
 
-class Spark:
-    def __init__(self, pos, angle, speed, color=(255, 255, 255)):
-        self.pos = list(pos)
-        self.angle = angle
-        self.speed = speed
-        self.color = color
+class SparkSystem:
+    """
+    Every spark of the level as numpy arrays.
+
+    A spark flies in a straight line and slows down until it stops, drawn as a diamond pointing along its
+    direction. The direction vector is computed once when the spark is added, so updating and building the
+    diamonds of all sparks is a few array operations and drawing is one polygon call per spark.
+    """
+
+    def __init__(self, capacity=512):
+        self.count = 0
+        self.pos = np.zeros((capacity, 2))
+        self.direction = np.zeros((capacity, 2))
+        self.speed = np.zeros(capacity)
+        self.color = np.zeros((capacity, 3), dtype=np.uint8)
+        # Stopped sparks are still drawn on the frame after their last update and removed on the next one
+        self.dying = np.zeros(capacity, dtype=bool)
+
+    def __len__(self):
+        return self.count
+
+    def add(self, pos, angle, speed, color=(255, 255, 255)):
+        if self.count == len(self.speed):
+            for name in ('pos', 'direction', 'speed', 'color', 'dying'):
+                column = getattr(self, name)
+                setattr(self, name, np.concatenate([column, np.zeros_like(column)]))
+        i = self.count
+        self.pos[i] = pos
+        self.direction[i] = (np.cos(angle), np.sin(angle))
+        self.speed[i] = speed
+        self.color[i] = color
+        self.dying[i] = False
+        self.count += 1
+
+    def clear(self):
+        self.count = 0
 
-    # Convert polar coordinates to cartesian coordinates
     def update(self):
-        self.pos[0] += math.cos(self.angle) * self.speed
-        self.pos[1] += math.sin(self.angle) * self.speed
-
-        self.speed = max(0, self.speed - 0.1)
-        return not self.speed
-
-    def render(self, surf, offset=(0, 0)):
-        # Create a polygon
-        # Lets do a fucking diamond cuz shine bright
-        render_points = [
-            (self.pos[0] + math.cos(self.angle) * self.speed * 3 - offset[0],
-             self.pos[1] + math.sin(self.angle) * self.speed * 3 - offset[1]),
-            (self.pos[0] + math.cos(self.angle + math.pi * 0.5) * self.speed * 0.5 - offset[0],
-             self.pos[1] + math.sin(self.angle + math.pi * 0.5) * self.speed * 0.5 - offset[1]),
-            (self.pos[0] + math.cos(self.angle + math.pi) * self.speed * 3 - offset[0],
-             self.pos[1] + math.sin(self.angle + math.pi) * self.speed * 3 - offset[1]),
-            (self.pos[0] + math.cos(self.angle - math.pi * 0.5) * self.speed * 0.5 - offset[0],
-             self.pos[1] + math.sin(self.angle - math.pi * 0.5) * self.speed * 0.5 - offset[1]),
-        ]
-
-        pygame.draw.polygon(surf, self.color, render_points)
+        if self.dying[:self.count].any():
+            keep = np.flatnonzero(~self.dying[:self.count])
+            for column in (self.pos, self.direction, self.speed, self.color):
+                column[:len(keep)] = column[keep]
+            self.count = len(keep)
+        n = self.count
+        speed = self.speed[:n]
+        self.pos[:n] += self.direction[:n] * speed[:, None]
+        np.maximum(speed - 0.1, 0, out=speed)
+        self.dying[:n] = speed == 0
+
+    def render(self, surf, offset=(0, 0), outline=None):
+        n = self.count
+        if not n:
+            return
+        # Diamond of every spark, long along its direction and narrow across it
+        center = self.pos[:n] - offset
+        along = self.direction[:n] * (self.speed[:n, None] * 3)
+        across = self.direction[:n, ::-1] * (self.speed[:n, None] * 0.5) * (-1, 1)
+        points = np.stack([center + along, center + across, center - along, center - across], axis=1)
+
+        # Only draw the ones that reach into the surface
+        width, height = surf.get_size()
+        low = points.min(axis=1)
+        high = points.max(axis=1)
+        visible = np.flatnonzero((high[:, 0] > -1) & (low[:, 0] < width + 1) &
+                                 (high[:, 1] > -1) & (low[:, 1] < height + 1))
+
+        diamonds = points[visible].tolist()
+        draw = pygame.draw.polygon
+        for color, diamond in zip(self.color[visible].tolist(), diamonds):
+            draw(surf, color, diamond)
+        if outline:
+            outline.add_polygons(diamonds)
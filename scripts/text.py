@@ -0,0 +1,44 @@
+from collections import OrderedDict
+
+import pygame
+
+# Rendered strings kept around, the least recently drawn ones are dropped first
+TEXT_CACHE_SIZE = 256
+
+
+class TextCache:
+    """
+    Fonts loaded once per (file, size) and rendered text surfaces kept in an LRU cache.
+
+    Text is keyed by (string, size, color, antialias, font file), so labels that are drawn every frame
+    are only rendered again when they change. Surfaces handed out are shared, don't draw on them.
+    """
+
+    def __init__(self, capacity=TEXT_CACHE_SIZE):
+        self.capacity = capacity
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+
+    # Font file None is pygame's default font
+    def font(self, size, name=None):
+        font = self.fonts.get((name, size))
+        if font is None:
+            font = pygame.font.Font(name, size)
+            self.fonts[(name, size)] = font
+        return font
+
+    def render(self, text, size, color, antialias=True, name=None):
+        key = (text, size, tuple(color), antialias, name)
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.surfaces.move_to_end(key)
+            return surf
+
+        surf = self.font(size, name).render(text, antialias, color)
+        self.surfaces[key] = surf
+        while len(self.surfaces) > self.capacity:
+            self.surfaces.popitem(last=False)
+        return surf
+
+    def clear(self):
+        self.surfaces.clear()
@@ -1,5 +1,11 @@
+import os
 import pygame
-import json
+import numpy as np
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+from scripts.levelfile import LevelData, read_level, write_level, JSON_EXT, BINARY_EXT
+from scripts.collision import SolidGrid, NEIGHBOR_OFFSETS
 
 # Rules for mapping out autotiling
 AUTOTILE_MAP = {
@@ -14,107 +20,644 @@ AUTOTILE_MAP = {
     tuple(sorted([(1, 0), (-1, 0), (0, 1), (0, -1)])): 8,
 }
 
-NEIGHBOR_OFFSETS = [(-1, 0), (-1, -1), (0, -1), (1, -1), (1, 0), (0, 0), (-1, 1), (0, 1), (1, 1)]
 PHYSICS_TILES = {'grass', 'stone', 'boulder', 'dirt'}
 AUTOTILE_TYPES = {'grass', 'stone', 'back_dirt', 'dirt'}
 
+# Neighbour shifts checked by autotiling, in the order of their bit in a neighbour mask
+AUTOTILE_SHIFTS = [(1, 0), (-1, 0), (0, -1), (0, 1)]
+
+# AUTOTILE_MAP as a lookup table from neighbour mask to variant (-1 where no rule applies)
+AUTOTILE_LUT = np.array([AUTOTILE_MAP.get(tuple(sorted(shift for bit, shift in enumerate(AUTOTILE_SHIFTS)
+                                                          if mask & (1 << bit))), -1) for mask in range(16)])
+
+# Chunks are CHUNK_SIZE x CHUNK_SIZE tiles, CHUNK_SIZE must be a power of two
+CHUNK_SHIFT = 4
+CHUNK_SIZE = 1 << CHUNK_SHIFT
+CHUNK_MASK = CHUNK_SIZE - 1
+
+# Size in pixels of the buckets used to index off-grid tiles
+OFFGRID_BUCKET_SIZE = 64
+
+# Max number of baked chunk surfaces kept around (least recently drawn get dropped first)
+CHUNK_CACHE_SIZE = 96
+
+# Levels with at least this many grid cells are streamed chunk by chunk when loaded with a stream window
+STREAM_MIN_CELLS = 1 << 16
+
+
+class Chunk:
+    __slots__ = ('tiles', 'count', 'version')
+
+    def __init__(self):
+        # Dense row-major array of tile dicts (None for empty cells)
+        self.tiles = [None] * (CHUNK_SIZE * CHUNK_SIZE)
+        self.count = 0
+        # Bumped on every change so caches can tell when a chunk is stale
+        self.version = 0
+
+
+class TileGrid(MutableMapping):
+    """
+    On-grid tiles stored in fixed-size chunks keyed by integer chunk coordinates.
+
+    Lookups by integer grid position go through at/set/remove. The mapping
+    interface keeps the old 'x;y' string keys working for JSON maps and older code.
+    A (type, variant) -> positions index is kept up to date by set/remove/set_variant,
+    so variants should be changed through set_variant rather than on the tile dict.
+    """
+
+    def __init__(self):
+        self.chunks = {}
+        self.count = 0
+        # (type, variant) -> set of grid positions
+        self.index = {}
+        # Called as watcher(x, y, tile) after a cell changes (tile is None when removed)
+        self.watchers = []
+
+    # Tile at an integer grid position (or None)
+    def at(self, x, y):
+        chunk = self.chunks.get((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+        if chunk is not None:
+            return chunk.tiles[((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)]
+
+    def set(self, x, y, tile):
+        chunk_loc = (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        chunk = self.chunks.get(chunk_loc)
+        if chunk is None:
+            chunk = self.chunks[chunk_loc] = Chunk()
+        i = ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+        if chunk.tiles[i] is None:
+            chunk.count += 1
+            self.count += 1
+        else:
+            self.unindex(chunk.tiles[i], x, y)
+        chunk.tiles[i] = tile
+        chunk.version += 1
+        self.index.setdefault((tile['type'], tile['variant']), set()).add((x, y))
+        for watcher in self.watchers:
+            watcher(x, y, tile)
+
+    def remove(self, x, y):
+        chunk_loc = (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        chunk = self.chunks.get(chunk_loc)
+        if chunk is None:
+            return None
+        i = ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+        tile = chunk.tiles[i]
+        if tile is not None:
+            self.unindex(tile, x, y)
+            chunk.tiles[i] = None
+            chunk.count -= 1
+            chunk.version += 1
+            self.count -= 1
+            if not chunk.count:
+                del self.chunks[chunk_loc]
+            for watcher in self.watchers:
+                watcher(x, y, None)
+        return tile
+
+    # Throw away a whole chunk without telling the watchers (used when streaming a chunk out)
+    def drop_chunk(self, chunk_loc):
+        chunk = self.chunks.pop(chunk_loc, None)
+        if chunk is None:
+            return
+        for tile in chunk.tiles:
+            if tile is not None:
+                self.unindex(tile, tile['pos'][0], tile['pos'][1])
+        self.count -= chunk.count
+
+    # Change the variant of the tile at a grid position in place
+    def set_variant(self, x, y, variant):
+        chunk = self.chunks.get((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+        tile = chunk.tiles[((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)] if chunk is not None else None
+        if tile is None or tile['variant'] == variant:
+            return
+        self.unindex(tile, x, y)
+        tile['variant'] = variant
+        self.index.setdefault((tile['type'], variant), set()).add((x, y))
+        chunk.version += 1
+
+    def unindex(self, tile, x, y):
+        positions = self.index.get((tile['type'], tile['variant']))
+        if positions is not None:
+            positions.discard((x, y))
+            if not positions:
+                del self.index[(tile['type'], tile['variant'])]
+
+    # Grid positions of all tiles of a type and variant
+    def find(self, tile_type, variant):
+        return self.index.get((tile_type, variant), ())
+
+    def tiles(self):
+        for chunk in list(self.chunks.values()):
+            for tile in chunk.tiles:
+                if tile is not None:
+                    yield tile
+
+    def chunks_in(self, rect):
+        # Yield (chunk_loc, chunk) for every chunk overlapping a rect given in grid coordinates
+        for cy in range(rect[1] >> CHUNK_SHIFT, ((rect[1] + rect[3] - 1) >> CHUNK_SHIFT) + 1):
+            for cx in range(rect[0] >> CHUNK_SHIFT, ((rect[0] + rect[2] - 1) >> CHUNK_SHIFT) + 1):
+                chunk = self.chunks.get((cx, cy))
+                if chunk is not None:
+                    yield (cx, cy), chunk
+
+    def to_dict(self):
+        return {self.make_key(tile['pos']): tile for tile in self.tiles()}
+
+    @staticmethod
+    def parse_key(key):
+        x, y = key.split(';')
+        return int(x), int(y)
+
+    @staticmethod
+    def make_key(pos):
+        return str(pos[0]) + ';' + str(pos[1])
+
+    # Compatibility layer for 'x;y' string keys
+    def __getitem__(self, key):
+        tile = self.at(*self.parse_key(key))
+        if tile is None:
+            raise KeyError(key)
+        return tile
+
+    def __setitem__(self, key, tile):
+        self.set(*self.parse_key(key), tile)
+
+    def __delitem__(self, key):
+        if self.remove(*self.parse_key(key)) is None:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return self.at(*self.parse_key(key)) is not None
+
+    def __iter__(self):
+        for tile in self.tiles():
+            yield self.make_key(tile['pos'])
+
+    def __len__(self):
+        return self.count
+
+    def values(self):
+        return list(self.tiles())
+
+    def copy(self):
+        return self.to_dict()
+
+
+class OffgridIndex:
+    """
+    Uniform bucket grid over the off-grid tiles, used for render culling and point/area queries.
+
+    Every tile is filed under each bucket its rect touches. Entries remember their insertion order
+    so query results come back in the same order the tiles were placed (which is the draw order).
+    Tiles are also indexed by (type, variant) for find.
+    """
+
+    def __init__(self, bucket_size=OFFGRID_BUCKET_SIZE):
+        self.bucket_size = bucket_size
+        self.buckets = {}
+        # id(tile) -> (order, tile, rect)
+        self.entries = {}
+        self.next_order = 0
+        # Bucket coordinates ever used, [min_x, min_y, max_x, max_y]
+        self.bounds = None
+        # (type, variant) -> {order: tile}
+        self.by_kind = {}
+
+    def bucket_range(self, rect, clamp=False):
+        size = self.bucket_size
+        x0, y0 = int(rect[0] // size), int(rect[1] // size)
+        x1, y1 = int((rect[0] + rect[2]) // size), int((rect[1] + rect[3]) // size)
+        if clamp:
+            # Queries never need to look at buckets outside of what has ever been filled
+            if self.bounds is None:
+                return
+            x0, y0 = max(x0, self.bounds[0]), max(y0, self.bounds[1])
+            x1, y1 = min(x1, self.bounds[2]), min(y1, self.bounds[3])
+        for bx in range(x0, x1 + 1):
+            for by in range(y0, y1 + 1):
+                yield bx, by
+
+    def add(self, tile, size):
+        entry = (self.next_order, tile, (tile['pos'][0], tile['pos'][1], size[0], size[1]))
+        self.next_order += 1
+        self.entries[id(tile)] = entry
+        self.by_kind.setdefault((tile['type'], tile['variant']), {})[entry[0]] = tile
+        for loc in self.bucket_range(entry[2]):
+            self.buckets.setdefault(loc, []).append(entry)
+            if self.bounds is None:
+                self.bounds = [loc[0], loc[1], loc[0], loc[1]]
+            else:
+                self.bounds = [min(self.bounds[0], loc[0]), min(self.bounds[1], loc[1]),
+                               max(self.bounds[2], loc[0]), max(self.bounds[3], loc[1])]
+
+    def remove(self, tile):
+        entry = self.entries.pop(id(tile), None)
+        if entry is None:
+            return False
+        kind = self.by_kind[(tile['type'], tile['variant'])]
+        del kind[entry[0]]
+        if not kind:
+            del self.by_kind[(tile['type'], tile['variant'])]
+        for loc in self.bucket_range(entry[2]):
+            bucket = self.buckets[loc]
+            bucket.remove(entry)
+            if not bucket:
+                del self.buckets[loc]
+        return True
+
+    # All tiles of a type and variant, as {order: tile}
+    def find(self, tile_type, variant):
+        return self.by_kind.get((tile_type, variant), {})
+
+    # All tiles whose rect overlaps the given rect, in placement order
+    def query_rect(self, rect):
+        found = {}
+        right = rect[0] + rect[2]
+        bottom = rect[1] + rect[3]
+        for loc in self.bucket_range(rect, clamp=True):
+            for entry in self.buckets.get(loc, ()):
+                r = entry[2]
+                if r[0] < right and rect[0] < r[0] + r[2] and r[1] < bottom and rect[1] < r[1] + r[3]:
+                    found[entry[0]] = entry[1]
+        return [found[order] for order in sorted(found)]
+
+    # All tiles whose rect contains the given point, in placement order
+    def query_point(self, pos):
+        found = []
+        loc = (int(pos[0] // self.bucket_size), int(pos[1] // self.bucket_size))
+        for entry in self.buckets.get(loc, ()):
+            r = entry[2]
+            if r[0] <= pos[0] < r[0] + r[2] and r[1] <= pos[1] < r[1] + r[3]:
+                found.append(entry)
+        return [entry[1] for entry in sorted(found, key=lambda entry: entry[0])]
+
 
 class Tilemap:
     def __init__(self, game, tile_size=14):
         self.game = game
         self.tile_size = tile_size
-        self.tilemap = {}
-        self.offgrid_tiles = []
+        self.tilemap = TileGrid()
+        self.tilemap.watchers.append(self.tile_changed)
+        # id(tile) -> tile, in placement order (which is the save order)
+        self.offgrid_tiles = {}
+        self.offgrid_index = OffgridIndex()
+        # Which cells collide, kept in sync with the grid through tile_changed
+        self.solid = SolidGrid(tile_size)
+        # Pre-baked terrain surfaces, chunk_loc -> ((reach, versions of the chunks it was baked from), surface)
+        self.chunk_cache = OrderedDict()
+
+        # Streaming state (stream is the LevelData being streamed, None when the whole level is loaded)
+        self.stream = None
+        self.stream_window = 1
+        # Resident chunk_loc -> off-grid tiles loaded with it
+        self.resident = {}
+        # chunk_loc -> rows of the level's off-grid table that belong to it
+        self.stream_offgrid = {}
+        # chunk_loc -> spawners (with pixel positions) that haven't been handed out yet
+        self.dormant_spawners = {}
 
     # Check if a certain terrain element is in the environment
     # Used to get the location of a terrain element
+    # Goes through the (type, variant) indexes, so it only costs as much as the number of matches
     def extract(self, id_pairs, keep=False):
         matches = []
-        for tile in self.offgrid_tiles.copy():
-            if (tile['type'], tile['variant']) in id_pairs:
-                matches.append(tile.copy())
-                if not keep:
-                    self.offgrid_tiles.remove(tile)
-
-        for loc in self.tilemap.copy():
-            tile = self.tilemap[loc]
-            if (tile['type'], tile['variant']) in id_pairs:
-                matches.append(tile.copy())
-                matches[-1]['pos'] = matches[-1]['pos'].copy()
-                matches[-1]['pos'][0] *= self.tile_size
-                matches[-1]['pos'][1] *= self.tile_size
-                if not keep:
-                    del self.tilemap[loc]
+        offgrid_matches = {}
+        for tile_type, variant in id_pairs:
+            offgrid_matches.update(self.offgrid_index.find(tile_type, variant))
+        for order in sorted(offgrid_matches):
+            tile = offgrid_matches[order]
+            matches.append(tile.copy())
+            if not keep:
+                self.remove_offgrid(tile)
+
+        grid_matches = []
+        for tile_type, variant in id_pairs:
+            grid_matches.extend(self.tilemap.find(tile_type, variant))
+        for x, y in sorted(grid_matches):
+            tile = self.tilemap.at(x, y)
+            matches.append(tile.copy())
+            matches[-1]['pos'] = [x * self.tile_size, y * self.tile_size]
+            if not keep:
+                self.tilemap.remove(x, y)
 
         return matches
 
+    # Place a tile on the grid
+    def set_tile(self, pos, tile_type, variant):
+        tile = self.tilemap.at(pos[0], pos[1])
+        if tile is not None and tile['type'] == tile_type and tile['variant'] == variant:
+            return
+        self.tilemap.set(pos[0], pos[1], {'type': tile_type, 'variant': variant, 'pos': list(pos)})
+
+    # Remove a tile from the grid, returns the removed tile (or None)
+    def remove_tile(self, pos):
+        return self.tilemap.remove(pos[0], pos[1])
+
+    # Keep derived grids in sync when a grid cell changes
+    def tile_changed(self, x, y, tile):
+        self.solid.set(x, y, tile is not None and tile['type'] in PHYSICS_TILES)
+
+    # Place an off-grid tile at a pixel position
+    def add_offgrid(self, tile):
+        self.offgrid_tiles[id(tile)] = tile
+        self.offgrid_index.add(tile, self.game.assets[tile['type']][tile['variant']].get_size())
+
+    def remove_offgrid(self, tile):
+        if self.offgrid_index.remove(tile):
+            del self.offgrid_tiles[id(tile)]
+
+    # Off-grid tiles overlapping a pixel rect (x, y, w, h)
+    def offgrid_in_rect(self, rect):
+        return self.offgrid_index.query_rect(rect)
+
+    # Off-grid tiles covering a pixel position
+    def offgrid_at(self, pos):
+        return self.offgrid_index.query_point(pos)
+
     def tiles_around(self, pos):
         tiles = []
         # Convert pixel to grid pos
-        tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
+        tile_x = int(pos[0] // self.tile_size)
+        tile_y = int(pos[1] // self.tile_size)
+        at = self.tilemap.at
         for offset in NEIGHBOR_OFFSETS:
-            check_loc = str(tile_loc[0] + offset[0]) + ';' + str(tile_loc[1] + offset[1])
-            if check_loc in self.tilemap:
-                tiles.append(self.tilemap[check_loc])
+            tile = at(tile_x + offset[0], tile_y + offset[1])
+            if tile is not None:
+                tiles.append(tile)
         return tiles
 
-    # Save terrain editor file
+    # Save terrain editor file (.json, or the binary format for .kmap)
+    # A .json map is saved together with its .kmap, so the two never drift apart
     def save(self, path):
-        f = open(path, 'w')
-        json.dump({'tilemap': self.tilemap, 'tile_size': self.tile_size, 'offgrid': self.offgrid_tiles}, f)
-        f.close()
+        level = LevelData.from_tiles(self.tile_size, list(self.tilemap.tiles()), list(self.offgrid_tiles.values()))
+        write_level(path, level)
+        if path.endswith(JSON_EXT):
+            write_level(os.path.splitext(path)[0] + BINARY_EXT, level)
+
+    # Load terrain editor file (.json or .kmap)
+    # With a stream_window, big levels are streamed: only chunks within stream_window chunks of the view
+    # (see update_stream) are kept loaded and spawners are handed out through take_spawners
+    def load(self, path, stream_window=None):
+        level = read_level(path, map_min_cells=STREAM_MIN_CELLS if stream_window is not None else None)
+
+        self.tilemap = TileGrid()
+        self.tile_size = level.tile_size
+        # Collision covers the whole level even when streaming, so entities outside the resident area still land
+        self.solid = SolidGrid.from_level(level, PHYSICS_TILES)
+        self.offgrid_tiles = {}
+        self.offgrid_index = OffgridIndex()
+        self.chunk_cache.clear()
+
+        if stream_window is not None and level.types.size >= STREAM_MIN_CELLS:
+            self.start_stream(level, stream_window)
+        else:
+            self.stream = None
+            self.resident = {}
+            self.dormant_spawners = {}
+            for tile in level.tiles():
+                self.tilemap.set(tile['pos'][0], tile['pos'][1], tile)
+            for tile in level.offgrid():
+                self.add_offgrid(tile)
+        self.tilemap.watchers.append(self.tile_changed)
+
+    # Chunk a pixel position is in
+    def chunk_of(self, pos):
+        chunk_px = self.tile_size << CHUNK_SHIFT
+        return int(pos[0] // chunk_px), int(pos[1] // chunk_px)
+
+    def start_stream(self, level, window):
+        self.stream = level
+        self.stream_window = window
+        self.resident = {}
+
+        # Spawners never become tiles, they're handed out once when the camera first gets close
+        self.dormant_spawners = {}
+        spawner_id = level.type_id('spawners')
+        ys, xs = np.nonzero(level.types == spawner_id) if spawner_id else (np.zeros(0, int), np.zeros(0, int))
+        for x, y, variant in zip((xs + level.origin[0]).tolist(), (ys + level.origin[1]).tolist(),
+                                 level.variants[ys, xs].tolist()):
+            spawner = {'type': 'spawners', 'variant': variant, 'pos': [x * self.tile_size, y * self.tile_size]}
+            self.dormant_spawners.setdefault(self.chunk_of(spawner['pos']), []).append(spawner)
+
+        self.stream_offgrid = {}
+        is_spawner = level.offgrid_types == spawner_id
+        for spawner in level.offgrid(np.flatnonzero(is_spawner)):
+            self.dormant_spawners.setdefault(self.chunk_of(spawner['pos']), []).append(spawner)
+        rows = np.flatnonzero(~is_spawner)
+        chunk_px = self.tile_size << CHUNK_SHIFT
+        chunk_locs = np.floor_divide(level.offgrid_pos[rows], chunk_px).astype(np.int64).tolist()
+        for row, chunk_loc in zip(rows.tolist(), chunk_locs):
+            self.stream_offgrid.setdefault(tuple(chunk_loc), []).append(row)
+
+    # Load the chunks around a view rect (x, y, w, h in pixels) and evict the ones that fell behind
+    # Returns (loaded, evicted) chunk locations
+    def update_stream(self, view_rect):
+        if self.stream is None:
+            return [], []
+        chunk_px = self.tile_size << CHUNK_SHIFT
+        x0 = int(view_rect[0] // chunk_px) - self.stream_window
+        y0 = int(view_rect[1] // chunk_px) - self.stream_window
+        x1 = int((view_rect[0] + view_rect[2]) // chunk_px) + self.stream_window
+        y1 = int((view_rect[1] + view_rect[3]) // chunk_px) + self.stream_window
 
-    # Load terrain editor file
-    def load(self, path):
-        f = open(path, 'r')
-        map_data = json.load(f)
-        f.close()
+        loaded = []
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                if (cx, cy) not in self.resident:
+                    self.load_chunk((cx, cy))
+                    loaded.append((cx, cy))
 
-        self.tilemap = map_data['tilemap']
-        self.tile_size = map_data['tile_size']
-        self.offgrid_tiles = map_data['offgrid']
+        # One chunk of slack so going back and forth over a chunk border doesn't reload it every time
+        evicted = [chunk_loc for chunk_loc in self.resident
+                   if not (x0 - 1 <= chunk_loc[0] <= x1 + 1 and y0 - 1 <= chunk_loc[1] <= y1 + 1)]
+        for chunk_loc in evicted:
+            self.evict_chunk(chunk_loc)
+
+        return loaded, evicted
+
+    def load_chunk(self, chunk_loc):
+        for tile in self.stream.tiles((chunk_loc[0] << CHUNK_SHIFT, chunk_loc[1] << CHUNK_SHIFT, CHUNK_SIZE, CHUNK_SIZE)):
+            if tile['type'] != 'spawners':
+                self.tilemap.set(tile['pos'][0], tile['pos'][1], tile)
+        offgrid = self.stream.offgrid(self.stream_offgrid.get(chunk_loc, []))
+        for tile in offgrid:
+            self.add_offgrid(tile)
+        self.resident[chunk_loc] = offgrid
+
+    def evict_chunk(self, chunk_loc):
+        for tile in self.resident.pop(chunk_loc):
+            self.remove_offgrid(tile)
+        self.tilemap.drop_chunk(chunk_loc)
+        self.chunk_cache.pop(chunk_loc, None)
+
+    # Hand out dormant spawners (only once each), optionally only from some chunks or of some variants
+    def take_spawners(self, chunk_locs=None, variants=None):
+        taken = []
+        for chunk_loc in list(self.dormant_spawners) if chunk_locs is None else chunk_locs:
+            spawners = self.dormant_spawners.get(chunk_loc)
+            if not spawners:
+                continue
+            remaining = []
+            for spawner in spawners:
+                (taken if variants is None or spawner['variant'] in variants else remaining).append(spawner)
+            if remaining:
+                self.dormant_spawners[chunk_loc] = remaining
+            else:
+                del self.dormant_spawners[chunk_loc]
+        return taken
+
+    # Number of spawners that haven't been handed out yet
+    def dormant_count(self):
+        return sum(len(spawners) for spawners in self.dormant_spawners.values())
 
     # Check for tiles affected by physics
+    # When streaming, the cell's chunk may not be loaded, then the tile comes from the level data instead
     def solid_check(self, pos):
-        tile_loc = str(int(pos[0] // self.tile_size)) + ';' + str(int(pos[1] // self.tile_size))
-        if tile_loc in self.tilemap:
-            if self.tilemap[tile_loc]['type'] in PHYSICS_TILES:
-                return self.tilemap[tile_loc]
+        if self.solid.solid_at(pos):
+            x, y = int(pos[0] // self.tile_size), int(pos[1] // self.tile_size)
+            tile = self.tilemap.at(x, y)
+            if tile is None and self.stream is not None:
+                tile = self.stream.tiles((x, y, 1, 1))[0]
+            return tile
+
+    # Batch version of solid_check for arrays of pixel coordinates, returns a boolean array
+    def solid_mask(self, xs, ys):
+        return self.solid.solid_mask(xs, ys)
 
     # Check if the tiles around has collision
+    # The returned rects are reused by the next call
     def physics_rects_around(self, pos):
-        rects = []
-        for tile in self.tiles_around(pos):
-            if tile['type'] in PHYSICS_TILES:
-                rects.append(
-                    pygame.Rect(tile['pos'][0] * self.tile_size, tile['pos'][1] * self.tile_size, self.tile_size,
-                                self.tile_size))
-        return rects
-
-    # Autofill when tiling
+        return self.solid.rects_around(pos)
+
+    # Move a pixel rect (x, y, w, h) through the solid tiles, returns the new (x, y) and the normals of what was hit
+    def move_rect(self, rect, movement):
+        return self.solid.move(rect, movement[0], movement[1])
+
+    # Change the variant of a grid tile in place
+    def set_variant(self, tile, variant):
+        self.tilemap.set_variant(tile['pos'][0], tile['pos'][1], variant)
+
+    # Autofill when tiling, one pass over the whole map with numpy
     def autotile(self):
-        for loc in self.tilemap:
-            tile = self.tilemap[loc]
-            neighbors = set()
-            for shift in [(1, 0), (-1, 0), (0, -1), (0, 1)]:
-                check_loc = str(tile['pos'][0] + shift[0]) + ';' + str(tile['pos'][1] + shift[1])
-                if check_loc in self.tilemap:
-                    if self.tilemap[check_loc]['type'] == tile['type']:
-                        neighbors.add(shift)
-            neighbors = tuple(sorted(neighbors))
-            if (tile['type'] in AUTOTILE_TYPES) and (neighbors in AUTOTILE_MAP):
-                tile['variant'] = AUTOTILE_MAP[neighbors]
+        tiles = [tile for tile in self.tilemap.tiles() if tile['type'] in AUTOTILE_TYPES]
+        if not tiles:
+            return
+        type_ids = {tile_type: i + 1 for i, tile_type in enumerate(AUTOTILE_TYPES)}
+        xs = np.array([tile['pos'][0] for tile in tiles])
+        ys = np.array([tile['pos'][1] for tile in tiles])
+        ids = np.array([type_ids[tile['type']] for tile in tiles], dtype=np.uint8)
+
+        # Dense grid of type ids with an empty border so every tile has four neighbours to look at
+        left, top = xs.min() - 1, ys.min() - 1
+        grid = np.zeros((ys.max() - top + 2, xs.max() - left + 2), dtype=np.uint8)
+        gx, gy = xs - left, ys - top
+        grid[gy, gx] = ids
+
+        masks = np.zeros(len(tiles), dtype=np.intp)
+        for bit, shift in enumerate(AUTOTILE_SHIFTS):
+            masks |= (grid[gy + shift[1], gx + shift[0]] == ids).astype(np.intp) << bit
+        variants = AUTOTILE_LUT[masks]
+
+        for i in np.flatnonzero(variants >= 0).tolist():
+            if tiles[i]['variant'] != variants[i]:
+                self.set_variant(tiles[i], int(variants[i]))
+
+    # Autotile only the given grid cells and their neighbours (for edits in the editor)
+    def autotile_cells(self, cells):
+        at = self.tilemap.at
+        affected = set()
+        for cell in cells:
+            affected.add((cell[0], cell[1]))
+            for shift in AUTOTILE_SHIFTS:
+                affected.add((cell[0] + shift[0], cell[1] + shift[1]))
+
+        for x, y in affected:
+            tile = at(x, y)
+            if tile is None or tile['type'] not in AUTOTILE_TYPES:
+                continue
+            mask = 0
+            for bit, shift in enumerate(AUTOTILE_SHIFTS):
+                neighbor = at(x + shift[0], y + shift[1])
+                if neighbor is not None and neighbor['type'] == tile['type']:
+                    mask |= 1 << bit
+            variant = AUTOTILE_LUT[mask]
+            if variant >= 0 and tile['variant'] != variant:
+                self.set_variant(tile, int(variant))
 
     # Render tiles
-    def render(self, surf, offset=(0, 0)):
-        for tile in self.offgrid_tiles:
-            surf.blit(self.game.assets[tile['type']][tile['variant']], (tile['pos'][0] - offset[0], tile['pos'][1] - offset[1]))
-
-        # I don't know what the fuck this is (but it's supposed to render only tiles that are visible, increasing performance)
-        for x in range(offset[0] // self.tile_size, (offset[0] + surf.get_width()) // self.tile_size + 1):
-            for y in range(offset[1] // self.tile_size, (offset[1] + surf.get_height()) // self.tile_size + 1):
-                loc = str(x) + ';' + str(y)
-                if loc in self.tilemap:
-                    tile = self.tilemap[loc]
-                    surf.blit(self.game.assets[tile['type']][tile['variant']], (
-                        tile['pos'][0] * self.tile_size - offset[0], tile['pos'][1] * self.tile_size - offset[1]))
+    # outline (an Outline) also gets everything that was drawn
+    # area (x, y, w, h on surf) limits drawing to the tiles and chunks touching part of surf
+    def render(self, surf, offset=(0, 0), outline=None, area=None):
+        if area is None:
+            area = (0, 0, surf.get_width(), surf.get_height())
+        view = (offset[0] + area[0], offset[1] + area[1], area[2], area[3])
+        blits = []
+        for tile in self.offgrid_in_rect(view):
+            blits.append((self.game.assets[tile['type']][tile['variant']],
+                          (tile['pos'][0] - offset[0], tile['pos'][1] - offset[1])))
+
+        # Terrain doesn't change during play, so it's drawn from one baked surface per chunk
+        # Chunk surfaces cover exactly their own chunk (see bake_chunk), so they never overlap each other
+        chunk_px = self.tile_size << CHUNK_SHIFT
+        reach = self.overhang()
+        for cx in range(view[0] // chunk_px, (view[0] + view[2]) // chunk_px + 1):
+            for cy in range(view[1] // chunk_px, (view[1] + view[3]) // chunk_px + 1):
+                chunk_surf = self.chunk_surf((cx, cy), reach)
+                if chunk_surf is not None:
+                    blits.append((chunk_surf, (cx * chunk_px - offset[0], cy * chunk_px - offset[1])))
+        surf.blits(blits, doreturn=False)
+        if outline:
+            outline.add(blits)
+
+    # How many cells the grid tile images reach past their own cell, (right, down)
+    def overhang(self):
+        reach = [0, 0]
+        for tile_type, variant in self.tilemap.index:
+            size = self.game.assets[tile_type][variant].get_size()
+            reach[0] = max(reach[0], (size[0] - 1) // self.tile_size)
+            reach[1] = max(reach[1], (size[1] - 1) // self.tile_size)
+        return tuple(reach)
+
+    # Get the baked surface of a chunk, re-baking it if it or a neighbour hanging into it changed since the last bake
+    # reach is what overhang returns
+    def chunk_surf(self, chunk_loc, reach):
+        # The chunk itself and the ones to the left/above whose tiles can reach into it, as (chunk, version)
+        sources = []
+        for cx in range(((chunk_loc[0] << CHUNK_SHIFT) - reach[0]) >> CHUNK_SHIFT, chunk_loc[0] + 1):
+            for cy in range(((chunk_loc[1] << CHUNK_SHIFT) - reach[1]) >> CHUNK_SHIFT, chunk_loc[1] + 1):
+                chunk = self.tilemap.chunks.get((cx, cy))
+                sources.append((chunk, chunk.version) if chunk is not None else None)
+        if not any(sources):
+            return None
+        key = (reach, tuple(sources))
+        cached = self.chunk_cache.get(chunk_loc)
+        if cached is not None and cached[0] == key:
+            self.chunk_cache.move_to_end(chunk_loc)
+            return cached[1]
+
+        chunk_surf = self.bake_chunk(chunk_loc, reach)
+        self.chunk_cache[chunk_loc] = (key, chunk_surf)
+        self.chunk_cache.move_to_end(chunk_loc)
+        while len(self.chunk_cache) > CHUNK_CACHE_SIZE:
+            self.chunk_cache.popitem(last=False)
+        return chunk_surf
+
+    # Draw the tiles covering a chunk onto a transparent surface the size of the chunk
+    # Tiles up to reach cells to the left/above hang into the chunk, so they're drawn too and everything goes in
+    # the same column by column order as drawing the whole map at once, also at chunk borders
+    def bake_chunk(self, chunk_loc, reach):
+        ts = self.tile_size
+        left, top = chunk_loc[0] << CHUNK_SHIFT, chunk_loc[1] << CHUNK_SHIFT
+        at = self.tilemap.at
+        blits = []
+        for x in range(left - reach[0], left + CHUNK_SIZE):
+            for y in range(top - reach[1], top + CHUNK_SIZE):
+                tile = at(x, y)
+                if tile is not None:
+                    blits.append((self.game.assets[tile['type']][tile['variant']], ((x - left) * ts, (y - top) * ts)))
+
+        chunk_surf = pygame.Surface((ts << CHUNK_SHIFT, ts << CHUNK_SHIFT), pygame.SRCALPHA)
+        chunk_surf.blits(blits, doreturn=False)
+        return chunk_surf
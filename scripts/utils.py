@@ -33,23 +33,51 @@ def scaled_loader(path, dimensions=(14, 18)):
 
 
 class Animation:
+    """
+    An animation clip: the frames and timing, shared by everything that plays it and never changed.
+
+    Playback state lives in an AnimationCursor (see play), so starting an animation doesn't copy the clip.
+    """
+
     def __init__(self, images, img_dur=5, loop=True):
         self.images = images
+        # Mirrored frames, made once here so rendering never has to flip
+        self.flipped = [pygame.transform.flip(img, True, False) for img in images]
         self.img_duration = img_dur
         self.loop = loop
-        self.done = False
-        self.frame = 0
+        self.length = img_dur * len(images)
+        # Image to show on every tick of the animation, so looking one up is a single list index
+        self.frame_images = [images[i // img_dur] for i in range(self.length)]
+        self.frame_images_flipped = [self.flipped[i // img_dur] for i in range(self.length)]
+
+    def play(self, frame=0):
+        return AnimationCursor(self, frame)
 
     def copy(self):
-        return Animation(self.images, self.img_duration, self.loop)
+        return self.play()
+
+
+class AnimationCursor:
+    """Where something is in an animation clip."""
+
+    __slots__ = ('clip', 'frame', 'done')
+
+    def __init__(self, clip, frame=0):
+        self.start(clip, frame)
+
+    # Switch to a clip (or restart the current one) without making a new cursor
+    def start(self, clip, frame=0):
+        self.clip = clip
+        self.frame = frame
+        self.done = False
 
     def update(self):
-        if self.loop:
-            self.frame = (self.frame + 1) % (self.img_duration * len(self.images))
+        if self.clip.loop:
+            self.frame = (self.frame + 1) % self.clip.length
         else:
-            self.frame = min(self.frame + 1, self.img_duration * len(self.images) - 1)
-            if self.frame >= self.img_duration * len(self.images) - 1:
+            self.frame = min(self.frame + 1, self.clip.length - 1)
+            if self.frame >= self.clip.length - 1:
                 self.done = True
 
-    def img(self):
-        return self.images[int(self.frame / self.img_duration)]
+    def img(self, flip=False):
+        return (self.clip.frame_images_flipped if flip else self.clip.frame_images)[self.frame]